@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark of filter_datum against the former one-re.sub-per-field loop.
+
+Usage: ./bench_filter_datum.py [lines]
+"""
+import re
+import sys
+import time
+from typing import Callable, List
+
+from filtered_logger import filter_datum
+
+
+def loop_filter_datum(
+    fields: List[str],
+    redaction: str,
+    message: str,
+    separator: str
+) -> str:
+    """ Former implementation: one regex scan per field """
+    for field in fields:
+        message = re.sub(
+            rf'{field}=[^{separator}]*', f'{field}={redaction}', message
+        )
+    return message
+
+
+def lines_per_second(
+    func: Callable[..., str],
+    fields: List[str],
+    lines: List[str]
+) -> float:
+    """ Returns how many lines per second func redacts """
+    start = time.perf_counter()
+    for line in lines:
+        func(fields, "***", line, ";")
+    return len(lines) / (time.perf_counter() - start)
+
+
+def main(count: int) -> None:
+    """ Runs the benchmark for 1, 5 and 50 fields """
+    print("{:>6} {:>14} {:>14} {:>8}".format(
+        "fields", "loop lines/s", "engine lines/s", "speedup"))
+    for n_fields in (1, 5, 50):
+        fields = ["field_{}".format(i) for i in range(n_fields)]
+        line = ";".join("{}=value{}".format(f, i)
+                        for i, f in enumerate(fields)) + ";"
+        lines = [line] * count
+        loop = lines_per_second(loop_filter_datum, fields, lines)
+        engine = lines_per_second(filter_datum, fields, lines)
+        print("{:>6} {:>14,.0f} {:>14,.0f} {:>7.1f}x".format(
+            n_fields, loop, engine, engine / loop))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
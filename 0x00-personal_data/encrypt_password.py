@@ -3,42 +3,110 @@
 Module for password encryption using bcrypt.
 """
 
+import os
+import sys
+import time
 import bcrypt
+from typing import Callable, Optional
 
 
-def hash_password(password: str) -> bytes:
+# bcrypt work factor, see calibrate_rounds to pick one for this hardware
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Hashes a password string using bcrypt.
 
     Args:
         password: A string representing the password to be hashed.
+        rounds: The bcrypt work factor, BCRYPT_ROUNDS by default.
 
     Returns:
         A salted, hashed password as a byte string.
     """
     # Generate a salt and hash the password
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
 
     return hashed_password
 
 
-def is_valid(hashed_password: bytes, password: str) -> bool:
+def hash_rounds(hashed_password: bytes) -> int:
+    """
+    Returns the work factor a bcrypt hash was made with.
+
+    Args:
+        hashed_password: A byte string such as b'$2b$12$...'.
+
+    Returns:
+        The cost stored in the hash, or 0 if it can't be read.
+    """
+    try:
+        return int(hashed_password.split(b'$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Tells whether a hash was made with a cost other than BCRYPT_ROUNDS.
+    """
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
+
+
+def is_valid(
+    hashed_password: bytes,
+    password: str,
+    rehash: Optional[Callable[[bytes], None]] = None
+) -> bool:
     """
     Validates a password against a hashed password using bcrypt.
 
     Args:
         hashed_password: A byte string representing the hashed password.
         password: A string representing the plain-text password to validate.
+        rehash: Called with a new hash when the password matches but the
+                stored hash was made with a different cost.
 
     Returns:
         bool: True if the password matches the hashed password,
         False otherwise.
     """
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    if not bcrypt.checkpw(password.encode('utf-8'), hashed_password):
+        return False
+    if rehash is not None and needs_rehash(hashed_password):
+        rehash(hash_password(password))
+    return True
+
+
+def calibrate_rounds(target_ms: float = 250.0) -> int:
+    """
+    Picks the highest bcrypt cost that hashes within target_ms here.
+
+    Args:
+        target_ms: The latency budget of one hash in milliseconds.
+
+    Returns:
+        The work factor to set in BCRYPT_ROUNDS.
+    """
+    rounds = 4
+    while rounds < 31:
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds + 1))
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        rounds += 1
+    return rounds
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "calibrate":
+        # Usage: ./encrypt_password.py calibrate [target_ms]
+        target = float(sys.argv[2]) if len(sys.argv) > 2 else 250.0
+        print("BCRYPT_ROUNDS={}".format(calibrate_rounds(target)))
+        sys.exit(0)
+
     # Example usage
     password = "MyAmazingPassw0rd"
     hashed_password = hash_password(password)
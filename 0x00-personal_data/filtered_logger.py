@@ -5,14 +5,80 @@ Module for filtering PII in log messages and connecting to a secure database.
 
 import os
 import re
+import queue
+import atexit
 import logging
+import threading
+import logging.handlers
 import mysql.connector
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence, Tuple
 
 
 # Define PII_FIELDS constant
 PII_FIELDS: Tuple[str, ...] = ("name", "email", "phone", "ssn", "password")
 
+# Number of rows fetched per round trip when exporting the users table
+BATCH_SIZE = int(os.getenv("PERSONAL_DATA_DB_BATCH_SIZE", "1000"))
+
+# Asynchronous logging pipeline settings
+LOG_ASYNC = os.getenv("PERSONAL_DATA_LOG_ASYNC", "0") == "1"
+LOG_QUEUE_SIZE = int(os.getenv("PERSONAL_DATA_LOG_QUEUE_SIZE", "10000"))
+LOG_QUEUE_POLICY = os.getenv("PERSONAL_DATA_LOG_QUEUE_POLICY", "drop")
+LOG_FLUSH_BATCH = int(os.getenv("PERSONAL_DATA_LOG_FLUSH_BATCH", "100"))
+
+
+class Redactor:
+    """ Single-pass redaction engine
+
+    Compiles a set of fields into one alternation pattern so every field
+    of a log line is obfuscated in a single scan of the message.
+
+    With multiline, a value also ends at a CR or LF character, so that
+    a text of many log lines is redacted line by line: the last field of
+    a line without a trailing separator does not swallow the next line.
+    """
+
+    def __init__(
+        self,
+        fields: Sequence[str],
+        redaction: str,
+        separator: str,
+        multiline: bool = False
+    ):
+        """ Compile the pattern for the given fields and separator """
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self.multiline = multiline
+        self._pattern = None
+        if self.fields:
+            names = dict.fromkeys(self.fields)
+            self._pattern = re.compile(r'({})=[^{}{}]*'.format(
+                '|'.join(re.escape(name) for name in names),
+                re.escape(separator),
+                r'\r\n' if multiline else ''
+            ))
+        suffix = '=' + redaction
+        self._replacement = lambda match: match[1] + suffix
+
+    def redact(self, message: str) -> str:
+        """ Returns the message with every field obfuscated """
+        if self._pattern is None:
+            return message
+        return self._pattern.sub(self._replacement, message)
+
+
+@lru_cache(maxsize=128)
+def get_redactor(
+    fields: Tuple[str, ...],
+    redaction: str,
+    separator: str,
+    multiline: bool = False
+) -> Redactor:
+    """ Returns a cached Redactor for the given configuration """
+    return Redactor(fields, redaction, separator, multiline)
+
 
 def filter_datum(
     fields: List[str],
@@ -33,11 +99,8 @@ def filter_datum(
     Returns:
         The obfuscated log message as a string.
     """
-    for field in fields:
-        message = re.sub(
-            rf'{field}=[^{separator}]*', f'{field}={redaction}', message
-        )
-    return message
+    redactor = get_redactor(tuple(fields), redaction, separator)
+    return redactor.redact(message)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -51,33 +114,173 @@ class RedactingFormatter(logging.Formatter):
         """ Initialize the formatter with fields to redact """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.redactor = Redactor(fields, self.REDACTION, self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
         """ Format the log record, redacting sensitive information """
         original_message = super(RedactingFormatter, self).format(record)
-        redacted_message = filter_datum(
-            self.fields, self.REDACTION, original_message, self.SEPARATOR
-        )
-        return redacted_message
+        return self.redactor.redact(original_message)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler on a bounded queue with a drop or block policy
+
+    Records are queued as they are: formatting, and so redaction, is left
+    to the listener thread instead of the calling thread.
+    """
+
+    POLICIES = ("drop", "block")
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE,
+                 policy: str = LOG_QUEUE_POLICY):
+        """ Initialize the handler with a queue of maxsize records """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        super(BoundedQueueHandler, self).__init__(queue.Queue(maxsize))
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """ Leave the record untouched, the listener formats it """
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """ Queue the record, dropping it when the queue is full """
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """ StreamHandler that leaves flushing to its caller """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """ Write the formatted record without flushing the stream """
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
 
 
-def get_logger() -> logging.Logger:
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """ QueueListener that handles records in batches
+
+    Up to batch_size queued records are handled before the handlers are
+    flushed once, so a burst of records costs one flush.
+    """
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler,
+                 batch_size: int = LOG_FLUSH_BATCH):
+        """ Initialize the listener """
+        super(BatchingQueueListener, self).__init__(log_queue, *handlers)
+        self.batch_size = batch_size
+        self.flushed = 0
+
+    def _monitor(self) -> None:
+        """ Handle queued records batch by batch until the sentinel """
+        q = self.queue
+        done = False
+        while not done:
+            batch = [q.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            count = 0
+            for record in batch:
+                if record is self._sentinel:
+                    done = True
+                else:
+                    self.handle(record)
+                    count += 1
+                q.task_done()
+            for handler in self.handlers:
+                handler.flush()
+            self.flushed += count
+
+    def enqueue_sentinel(self) -> None:
+        """ Queue the sentinel, waiting for room in a full queue """
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[BatchingQueueListener] = None
+_queue_handler: Optional[BoundedQueueHandler] = None
+_listener_lock = threading.Lock()
+
+
+def get_logging_stats() -> dict:
+    """ Returns the dropped and flushed counters of the async pipeline """
+    with _listener_lock:
+        return {
+            "dropped": _queue_handler.dropped if _queue_handler else 0,
+            "flushed": _listener.flushed if _listener else 0,
+        }
+
+
+def shutdown_logging() -> dict:
+    """
+    Drain the asynchronous logging queue and stop its worker.
+
+    Returns:
+        The final dropped and flushed counters of the pipeline.
+    """
+    global _listener, _queue_handler
+    stats = {"dropped": 0, "flushed": 0}
+    with _listener_lock:
+        if _listener is None:
+            return stats
+        logging.getLogger("user_data").removeHandler(_queue_handler)
+        _listener.stop()
+        stats = {"dropped": _queue_handler.dropped,
+                 "flushed": _listener.flushed}
+        _listener = None
+        _queue_handler = None
+    return stats
+
+
+atexit.register(shutdown_logging)
+
+
+def get_logger(asynchronous: bool = LOG_ASYNC) -> logging.Logger:
     """
     Creates and returns a logger named 'user_data' with a stream handler
     using RedactingFormatter.
 
+    Args:
+        asynchronous: When True, records go through a bounded queue and
+                      are formatted and written by a background listener.
+
     Returns:
         A logging.Logger object.
     """
+    global _listener, _queue_handler
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-    stream_handler = logging.StreamHandler()
     formatter = RedactingFormatter(list(PII_FIELDS))
-    stream_handler.setFormatter(formatter)
 
-    logger.addHandler(stream_handler)
+    if not asynchronous:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        logger.addHandler(stream_handler)
+        return logger
+
+    with _listener_lock:
+        if _listener is None:
+            _queue_handler = BoundedQueueHandler()
+            stream_handler = BatchStreamHandler()
+            stream_handler.setFormatter(formatter)
+            _listener = BatchingQueueListener(_queue_handler.queue,
+                                              stream_handler)
+            _listener.start()
+            logger.addHandler(_queue_handler)
 
     return logger
 
@@ -108,27 +311,59 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     )
 
 
+def export_rows(
+    cursor,
+    fields: Sequence[str] = PII_FIELDS,
+    redaction: str = "***",
+    batch_size: int = BATCH_SIZE
+) -> Iterator[str]:
+    """
+    Yields one filtered log line per row of an executed query.
+
+    Rows are pulled with fetchmany so only one batch is held in memory at
+    a time. The columns to redact are worked out once from the cursor
+    description instead of filtering every value of every row.
+
+    Args:
+        cursor: A cursor on which a SELECT statement has been executed.
+        fields: The column names to obfuscate.
+        redaction: The string replacing the value of obfuscated columns.
+        batch_size: The number of rows fetched per round trip.
+
+    Yields:
+        The "key=value; ..." representation of each row.
+    """
+    columns = [column[0] for column in cursor.description]
+    redacted = [column in fields for column in columns]
+    prefixes = [f"{column}=" for column in columns]
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield "; ".join(
+                prefix + (redaction if hide else str(value))
+                for prefix, hide, value in zip(prefixes, redacted, row)
+            )
+
+
 def main():
     """
     Retrieves all rows in the users table and logs each row in a filtered
     format.
+
+    Rows are streamed from an unbuffered cursor in batches of BATCH_SIZE,
+    so memory use does not grow with the size of the table.
     """
     logger = get_logger()
 
     try:
         db = get_db()
-        cursor = db.cursor(dictionary=True)
+        cursor = db.cursor(buffered=False)
         cursor.execute("SELECT * FROM users;")
-        rows = cursor.fetchall()
 
-        for row in rows:
-            filtered_data = {
-                key: filter_datum(PII_FIELDS, "***", str(value), ";")
-                for key, value in row.items()
-            }
-            log_message = "; ".join(
-                f"{key}={value}" for key, value in filtered_data.items()
-            )
+        for log_message in export_rows(cursor):
             logger.info(log_message)
 
     except mysql.connector.Error as err:
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Command line tool to scrub PII from log archives.
+
+Applies the same rules as filter_datum/PII_FIELDS to whole log files.
+Files are streamed in line-aligned chunks which are redacted across a
+process pool and written back in their original order.
+
+Usage: ./redact_logs.py [-o OUTPUT] [-w WORKERS] FILE [FILE ...]
+"""
+import argparse
+import gzip
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Sequence
+
+from filtered_logger import PII_FIELDS, Redactor, get_redactor
+
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+_redactor: Redactor = None
+
+
+def _init_worker(
+    fields: Sequence[str],
+    redaction: str,
+    separator: str
+) -> None:
+    """ Compile the redaction pattern once per worker process """
+    global _redactor
+    # Chunks hold many lines: a value must not run past its line
+    _redactor = get_redactor(tuple(fields), redaction, separator, True)
+
+
+def redact_chunk(chunk: bytes) -> bytes:
+    """ Returns the chunk with every PII field obfuscated """
+    text = chunk.decode('utf-8', 'surrogateescape')
+    return _redactor.redact(text).encode('utf-8', 'surrogateescape')
+
+
+def mmap_chunks(path: str, chunk_size: int) -> Iterator[bytes]:
+    """
+    Yields line-aligned chunks of an uncompressed file through mmap.
+
+    Args:
+        path: The path of the file to read.
+        chunk_size: The approximate number of bytes per chunk.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start, size = 0, len(mm)
+            while start < size:
+                end = mm.find(b'\n', min(start + chunk_size, size) - 1)
+                end = size if end == -1 else end + 1
+                yield mm[start:end]
+                start = end
+
+
+def stream_chunks(f: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    """
+    Yields line-aligned chunks of a file object.
+
+    Args:
+        f: A binary file object, such as a gzip.GzipFile.
+        chunk_size: The approximate number of bytes per chunk.
+    """
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        if not chunk.endswith(b'\n'):
+            chunk += f.readline()
+        yield chunk
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[bytes]:
+    """ Yields the chunks of a plain or gzip compressed file """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            yield from stream_chunks(f, chunk_size)
+    elif path == '-':
+        yield from stream_chunks(sys.stdin.buffer, chunk_size)
+    else:
+        yield from mmap_chunks(path, chunk_size)
+
+
+def open_output(path: str) -> BinaryIO:
+    """ Opens the output stream, gzip compressed for a .gz path """
+    if path == '-':
+        return sys.stdout.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wb')
+    return open(path, 'wb')
+
+
+def redact_files(
+    paths: List[str],
+    output: BinaryIO,
+    workers: int,
+    chunk_size: int = CHUNK_SIZE,
+    fields: Sequence[str] = PII_FIELDS,
+    redaction: str = "***",
+    separator: str = ";"
+) -> int:
+    """
+    Redacts files across a process pool, keeping the order of the lines.
+
+    At most two chunks per worker are in flight, so memory use does not
+    grow with the size of the input.
+
+    Returns:
+        The number of input bytes processed.
+    """
+    total = 0
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(tuple(fields), redaction, separator)
+    ) as pool:
+        for path in paths:
+            for chunk in read_chunks(path, chunk_size):
+                total += len(chunk)
+                pending.append(pool.submit(redact_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    output.write(pending.popleft().result())
+        while pending:
+            output.write(pending.popleft().result())
+    return total
+
+
+def main() -> None:
+    """ Parses the command line and redacts the given files """
+    parser = argparse.ArgumentParser(
+        description="Redact PII fields from log files.")
+    parser.add_argument('files', nargs='+',
+                        help="log files to redact, .gz or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-',
+                        help="output file, gzip compressed if it ends "
+                             "with .gz (default: stdout)")
+    parser.add_argument('-w', '--workers', type=int,
+                        default=os.cpu_count() or 1,
+                        help="number of worker processes")
+    parser.add_argument('-c', '--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="approximate bytes per chunk")
+    parser.add_argument('-f', '--fields', nargs='+', default=PII_FIELDS,
+                        help="fields to obfuscate (default: PII_FIELDS)")
+    parser.add_argument('-r', '--redaction', default="***")
+    parser.add_argument('-s', '--separator', default=";")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    output = open_output(args.output)
+    try:
+        total = redact_files(args.files, output, args.workers,
+                             args.chunk_size, args.fields,
+                             args.redaction, args.separator)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print("{:.1f} MB in {:.2f}s: {:.1f} MB/s".format(
+        total / 1e6, elapsed, total / 1e6 / elapsed if elapsed else 0),
+        file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ Route module for the API
 """
 from os import getenv
 from api.v1.views import app_views
-from flask import Flask, jsonify, abort, request
+from flask import Flask, jsonify, abort, request, g
 from flask_cors import (CORS, cross_origin)
 
 
@@ -56,10 +56,18 @@ def before_request() -> None:
         return
     if auth.authorization_header(request) is None:
         abort(401)
-    if auth.current_user(request) is None:
+    request.current_user = auth.request_user(request)
+    if request.current_user is None:
         abort(403)
 
 
+@app.after_request
+def after_request(response):
+    """ Report the number of auth lookups made for the request """
+    response.headers['X-Auth-Lookups'] = str(g.get('auth_lookups', 0))
+    return response
+
+
 if __name__ == "__main__":
     host = getenv("API_HOST", "0.0.0.0")
     port = getenv("API_PORT", "5000")
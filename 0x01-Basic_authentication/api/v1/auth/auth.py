@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """ Auth class for API authentication """
 from typing import List, TypeVar
-from flask import request
+from flask import g, has_request_context, request
 
 
 class Auth:
@@ -34,3 +34,18 @@ class Auth:
     def current_user(self, request=None) -> TypeVar('User'):
         """ Method for current user """
         return None
+
+    def request_user(self, request=None) -> TypeVar('User'):
+        """ Returns current_user(request), looked up once per request
+
+        The user is memoized on the request context, and g.auth_lookups
+        counts the lookups made for the request.
+        """
+        if request is None:
+            return None
+        if not has_request_context():
+            return self.current_user(request)
+        if 'auth_user' not in g:
+            g.auth_lookups = g.get('auth_lookups', 0) + 1
+            g.auth_user = self.current_user(request)
+        return g.auth_user
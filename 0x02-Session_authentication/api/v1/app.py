@@ -4,8 +4,9 @@ Route module for the API
 """
 from os import getenv
 from api.v1.views import app_views
-from flask import Flask, jsonify, abort, request
+from flask import Flask, jsonify, abort, request, g
 from flask_cors import (CORS, cross_origin)
+from api.v1.auth.path_matcher import PathMatcher
 
 app = Flask(__name__)
 app.register_blueprint(app_views)
@@ -13,6 +14,12 @@ CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 
 auth = None
 AUTH_TYPE = getenv("AUTH_TYPE")
+EXCLUDED_PATHS = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/'
+])
 
 if AUTH_TYPE == "auth":
     from api.v1.auth.auth import Auth
@@ -23,6 +30,12 @@ elif AUTH_TYPE == "basic_auth":
 elif AUTH_TYPE == "session_auth":
     from api.v1.auth.session_auth import SessionAuth
     auth = SessionAuth()
+elif AUTH_TYPE == "session_exp_auth":
+    from api.v1.auth.session_exp_auth import SessionExpAuth
+    auth = SessionExpAuth()
+elif AUTH_TYPE == "session_db_auth":
+    from api.v1.auth.session_db_auth import SessionDBAuth
+    auth = SessionDBAuth()
 
 
 @app.errorhandler(404)
@@ -48,20 +61,21 @@ def before_request() -> None:
     """ Method to handle before request processing """
     if auth is None:
         return
-    excluded_paths = [
-        '/api/v1/status/',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/',
-        '/api/v1/auth_session/login/'
-    ]
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS, request.method):
         return
     if (auth.authorization_header(request) is None and
             auth.session_cookie(request) is None):
         abort(401)
-    if auth.current_user(request) is None:
+    request.current_user = auth.request_user(request)
+    if request.current_user is None:
         abort(403)
-    request.current_user = auth.current_user(request)
+
+
+@app.after_request
+def after_request(response):
+    """ Report the number of auth lookups made for the request """
+    response.headers['X-Auth-Lookups'] = str(g.get('auth_lookups', 0))
+    return response
 
 
 if __name__ == "__main__":
@@ -1,30 +1,37 @@
 #!/usr/bin/env python3
 """ Auth class for API authentication """
 from typing import List, TypeVar
-from flask import request
+from flask import g, has_request_context, request
+from api.v1.auth.path_matcher import PathMatcher
 import os
 
 
 class Auth:
     """ Auth class template """
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
-        """ Method for authentication requirement """
+    _matchers = {}
+
+    def require_auth(self, path: str, excluded_paths: List[str],
+                     method: str = None) -> bool:
+        """ Method for authentication requirement
+
+        excluded_paths is a list of rules, or a PathMatcher compiled once
+        from them. Lists are compiled on first use and kept.
+        """
         if path is None or excluded_paths is None or not excluded_paths:
             return True
 
         if path[-1] != '/':
             path += '/'
 
-        for excluded_path in excluded_paths:
-            if excluded_path.endswith('*'):
-                base_path = excluded_path.rstrip('*')
-                if path.startswith(base_path):
-                    return False
-            elif path == excluded_path:
-                return False
+        if not isinstance(excluded_paths, PathMatcher):
+            key = tuple(excluded_paths)
+            matcher = self._matchers.get(key)
+            if matcher is None:
+                matcher = self._matchers[key] = PathMatcher(key)
+            excluded_paths = matcher
 
-        return True
+        return not excluded_paths.match(path, method)
 
     def authorization_header(self, request=None) -> str:
         """ Method for authorization header """
@@ -36,6 +43,21 @@ class Auth:
         """ Method for current user """
         return None
 
+    def request_user(self, request=None) -> TypeVar('User'):
+        """ Returns current_user(request), looked up once per request
+
+        The user is memoized on the request context, and g.auth_lookups
+        counts the lookups made for the request.
+        """
+        if request is None:
+            return None
+        if not has_request_context():
+            return self.current_user(request)
+        if 'auth_user' not in g:
+            g.auth_lookups = g.get('auth_lookups', 0) + 1
+            g.auth_user = self.current_user(request)
+        return g.auth_user
+
     def session_cookie(self, request=None):
         """ Returns a cookie value from a request """
         if request is None:
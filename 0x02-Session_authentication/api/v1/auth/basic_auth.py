@@ -6,6 +6,7 @@ import base64
 from typing import Tuple, Optional, TypeVar
 from models.user import User
 from api.v1.auth.auth import Auth
+from api.v1.auth.credential_cache import CredentialCache
 
 
 class BasicAuth(Auth):
@@ -13,6 +14,12 @@ class BasicAuth(Auth):
     BasicAuth class that inherits from Auth
     """
 
+    def __init__(self):
+        """
+        Initializes the cache of verified credentials
+        """
+        self.credential_cache = CredentialCache()
+
     def extract_base64_authorization_header(
             self, authorization_header: str
     ) -> Optional[str]:
@@ -84,6 +91,9 @@ class BasicAuth(Auth):
         auth_header = self.authorization_header(request)
         if auth_header is None:
             return None
+        user = self.credential_cache.get(auth_header)
+        if user is not None:
+            return user
         base64_auth = self.extract_base64_authorization_header(auth_header)
         if base64_auth is None:
             return None
@@ -93,4 +103,7 @@ class BasicAuth(Auth):
         user_email, user_pwd = self.extract_user_credentials(decoded_auth)
         if user_email is None or user_pwd is None:
             return None
-        return self.user_object_from_credentials(user_email, user_pwd)
+        user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is not None:
+            self.credential_cache.put(auth_header, user)
+        return user
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Credential cache module
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, TypeVar
+
+from models.user import User
+
+
+class CredentialCache:
+    """
+    Bounded, TTL-based cache of verified Authorization header values
+
+    Entries are keyed by an HMAC of the header value under a key that
+    only lives in this process, so no credentials are kept in memory.
+    Each entry maps to the user ID with the email and password hash seen
+    when the credentials were checked: a hit whose user was removed, or
+    whose email or password changed since, is dropped and counted as a
+    miss.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None):
+        """
+        Initializes the cache for maxsize entries kept ttl seconds
+        """
+        if maxsize is None:
+            maxsize = int(os.getenv("BASIC_AUTH_CACHE_SIZE", "1024"))
+        if ttl is None:
+            ttl = float(os.getenv("BASIC_AUTH_CACHE_TTL", "60"))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._key = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _digest(self, authorization_header: str) -> bytes:
+        """
+        Returns the keyed digest of a header value
+        """
+        return hmac.new(self._key, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def get(self, authorization_header: str) -> Optional[TypeVar('User')]:
+        """
+        Returns the user verified for this header value, if still valid
+        """
+        digest = self._digest(authorization_header)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                user_id, email, password, expires_at = entry
+                user = User.get(user_id)
+                if (expires_at > now and user is not None and
+                        user.email == email and user.password == password):
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return user
+                del self._entries[digest]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, authorization_header: str, user: TypeVar('User')) -> None:
+        """
+        Records that this header value authenticates user
+        """
+        if self.maxsize <= 0:
+            return
+        digest = self._digest(authorization_header)
+        entry = (user.id, user.email, user.password,
+                 time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[digest] = entry
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drops every entry
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the size and the hit, miss and eviction counters
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+""" Path matcher for the paths excluded from authentication """
+from typing import Dict, FrozenSet, Iterable, Optional
+
+# Methods of a rule applying to every method
+ANY_METHOD = None
+
+
+class PathMatcher:
+    """ Set of path rules compiled once for matching
+
+    A rule is a path, optionally preceded by an HTTP method and a space:
+      - '/api/v1/status/' matches this exact path
+      - '/api/v1/stat*' matches every path starting with '/api/v1/stat'
+      - 'POST /api/v1/auth_session/login/' only matches POST requests
+    Exact rules are looked up in a dict and wildcard rules in a character
+    trie, so a match costs a walk along the path whatever the number of
+    rules.
+    """
+
+    def __init__(self, rules: Iterable[str]):
+        """ Compile the rules """
+        self._count = 0
+        self._exact: Dict[str, Optional[FrozenSet[str]]] = {}
+        self._trie: dict = {}
+        for rule in rules:
+            self.add(rule)
+
+    @staticmethod
+    def _merge(current, methods):
+        """ Union of two method sets, where None stands for any method """
+        if current is ANY_METHOD or methods is ANY_METHOD:
+            return ANY_METHOD
+        return current | methods
+
+    def add(self, rule: str) -> None:
+        """ Add a rule """
+        methods = ANY_METHOD
+        if ' ' in rule:
+            method, rule = rule.split(' ', 1)
+            methods = frozenset([method.upper()])
+        if rule.endswith('*'):
+            node = self._trie
+            for char in rule.rstrip('*'):
+                node = node.setdefault(char, {})
+            if '' in node:
+                methods = self._merge(node[''], methods)
+            node[''] = methods
+        else:
+            if rule in self._exact:
+                methods = self._merge(self._exact[rule], methods)
+            self._exact[rule] = methods
+        self._count += 1
+
+    def __len__(self) -> int:
+        """ Number of rules """
+        return self._count
+
+    @staticmethod
+    def _allows(methods, method: Optional[str]) -> bool:
+        """ Whether a rule for methods applies to method """
+        return methods is ANY_METHOD or (method is not None and
+                                         method.upper() in methods)
+
+    def match(self, path: str, method: str = None) -> bool:
+        """ Whether a rule covers path, requested with method """
+        if path in self._exact and \
+                self._allows(self._exact[path], method):
+            return True
+        node = self._trie
+        for char in path:
+            if '' in node and self._allows(node[''], method):
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return '' in node and self._allows(node[''], method)
@@ -5,16 +5,42 @@ SessionAuth module
 
 import uuid
 import os  # Importing os module to use os.getenv
+from typing import List
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import SessionStore, get_session_store
+from api.v1.auth.session_token import TokenSigner, get_token_signer
 from models.user import User
 
 
 class SessionAuth(Auth):
     """
     SessionAuth class that inherits from Auth
+
+    Sessions live in the session store of the process (see
+    api.v1.auth.session_store), shared by every instance and, outside of
+    the memory backend, by every worker. With SESSION_TOKENS set, session
+    IDs are signed tokens instead (see api.v1.auth.session_token): only
+    the revoked ones are kept in the store, which each check looks up.
     """
 
-    user_id_by_session_id = {}  # Class attribute to store session ID mappings
+    session_duration = 0  # Seconds a session lasts, 0 for no expiration
+    # Sessions a user may hold at once, 0 for no limit
+    max_sessions_per_user = int(os.getenv("SESSION_MAX_PER_USER", "0"))
+
+    @property
+    def store(self) -> SessionStore:
+        """ Returns the session store """
+        return get_session_store()
+
+    @property
+    def tokens(self) -> TokenSigner:
+        """ Returns the session token signer, None without tokens """
+        return get_token_signer(self.store)
+
+    @property
+    def user_id_by_session_id(self) -> dict:
+        """ Returns the sessions of the memory store by session ID """
+        return self.store.sessions
 
     def authorization_header(self, request=None) -> str:
         """ Returns the value of the header request """
@@ -56,10 +82,30 @@ class SessionAuth(Auth):
         if user_id is None or not isinstance(user_id, str):
             return None
 
+        if self.tokens is not None:
+            return self.tokens.sign(user_id, self.session_duration)
+
         session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[session_id] = user_id
+        self.store.set(session_id, self.session_record(user_id),
+                       self.session_duration, user_id)
+        if self.max_sessions_per_user > 0:
+            session_ids = self.store.user_sessions(user_id)
+            for old_session_id in session_ids[:-self.max_sessions_per_user]:
+                self.store.delete(old_session_id)
         return session_id
 
+    def session_record(self, user_id: str):
+        """
+        Returns the record stored for a new session of user_id.
+
+        Args:
+            user_id (str): The user ID of the session.
+
+        Returns:
+            The user ID.
+        """
+        return user_id
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """
         Returns a User ID based on a Session ID.
@@ -72,7 +118,13 @@ class SessionAuth(Auth):
         """
         if session_id is None or not isinstance(session_id, str):
             return None
-        return self.user_id_by_session_id.get(session_id)
+        if self.tokens is not None:
+            return self.tokens.verify(session_id)
+        record = self.store.get(session_id)
+        if isinstance(record, dict):
+            # Record of a SessionExpAuth, or of the UserSession store
+            return record.get("user_id")
+        return record
 
     def destroy_session(self, request=None) -> bool:
         """
@@ -93,9 +145,41 @@ class SessionAuth(Auth):
         if not session_id:
             return False
 
+        if self.tokens is not None:
+            return self.tokens.revoke(session_id)
+
         user_id = self.user_id_for_session_id(session_id)
         if not user_id:
             return False
 
-        del self.user_id_by_session_id[session_id]
-        return True
+        return self.store.delete(session_id)
+
+    def user_sessions(self, user_id: str = None) -> List[str]:
+        """
+        Returns the Session IDs of a user.
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            list: The Session IDs of the user, oldest first. Signed
+            session tokens are not stored, so none are listed.
+        """
+        if user_id is None or self.tokens is not None:
+            return []
+        return self.store.user_sessions(user_id)
+
+    def destroy_user_sessions(self, user_id: str = None) -> int:
+        """
+        Deletes every session of a user / logout everywhere.
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            int: The number of sessions deleted. Signed session tokens
+            are not stored, so none are deleted.
+        """
+        if user_id is None or self.tokens is not None:
+            return 0
+        return self.store.delete_user(user_id)
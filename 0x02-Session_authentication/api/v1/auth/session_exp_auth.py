@@ -6,8 +6,8 @@ This module defines the SessionExpAuth class, which extends SessionAuth
 to include session expiration functionality based on a configurable duration.
 """
 from api.v1.auth.session_auth import SessionAuth
-from datetime import datetime, timedelta
 from os import getenv
+import time
 
 
 class SessionExpAuth(SessionAuth):
@@ -24,7 +24,9 @@ class SessionExpAuth(SessionAuth):
 
         Sets up the session duration based on the SESSION_DURATION environment
         variable. If SESSION_DURATION is not set or cannot be parsed as an
-        integer, session duration is set to 0 (no expiration).
+        integer, session duration is set to 0 (no expiration). When
+        SESSION_SLIDING is set to true, each use of a session extends it
+        by the session duration.
         """
         super().__init__()
         session_duration = getenv('SESSION_DURATION')
@@ -32,39 +34,33 @@ class SessionExpAuth(SessionAuth):
             self.session_duration = int(session_duration)
         except (TypeError, ValueError):
             self.session_duration = 0
+        self.sliding = getenv('SESSION_SLIDING', '').lower() in ('1', 'true')
 
-    def create_session(self, user_id=None):
+    def session_record(self, user_id):
         """
-        Create a session ID with an expiration.
+        Return the record stored for a new session.
 
-        Overrides the create_session method from SessionAuth to include
-        storing session creation time for later expiration checking.
+        Overrides the session_record method from SessionAuth to include
+        the session creation time for later expiration checking.
 
         Args:
             user_id (str): The user ID associated with the session.
 
         Returns:
-            str: The generated session ID.
-            None: If session creation fails.
+            dict: The user ID and the creation time of the session.
         """
-        session_id = super().create_session(user_id)
-        if not session_id:
-            return None
-
-        session_dict = {
+        return {
             "user_id": user_id,
-            "created_at": datetime.now()
+            "created_at": time.time()
         }
-        self.user_id_by_session_id[session_id] = session_dict
-        return session_id
 
     def user_id_for_session_id(self, session_id=None):
         """
         Return user ID if session is not expired.
 
         Checks if the session identified by session_id exists and is not
-        expired based on the session creation time and configured
-        session_duration.
+        expired based on the session creation time, or its last use in
+        sliding mode, and configured session_duration.
 
         Args:
             session_id (str): The session ID to lookup.
@@ -77,18 +73,26 @@ class SessionExpAuth(SessionAuth):
         if session_id is None:
             return None
 
-        session_dict = self.user_id_by_session_id.get(session_id)
+        if self.tokens is not None:
+            return super().user_id_for_session_id(session_id)
+
+        session_dict = self.store.get(session_id)
         if session_dict is None:
             return None
 
         if self.session_duration <= 0:
             return session_dict.get("user_id")
 
+        if self.sliding:
+            if not self.store.touch(session_id, self.session_duration):
+                return None
+            return session_dict.get("user_id")
+
         created_at = session_dict.get("created_at")
         if created_at is None:
             return None
 
-        if created_at + timedelta(seconds=self.session_duration) < datetime.now():
+        if created_at + self.session_duration < time.time():
             return None
 
         return session_dict.get("user_id")
@@ -0,0 +1,986 @@
+#!/usr/bin/env python3
+"""
+Session store module
+
+Session records are kept behind the SessionStore interface so that every
+worker process of the API can share them. The backend is chosen with
+SESSION_STORE:
+  - memory: a dictionary in the current process (default)
+  - sqlite: a SQLite database file, SESSION_STORE_PATH
+  - redis: a Redis server, SESSION_STORE_URL (redis://host:port/db)
+  - db: UserSession objects on disk, the store of SessionDBAuth
+"""
+from collections import deque
+import heapq
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from models.base import DATA
+from models.user_session import UserSession
+
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", ".db_sessions.sqlite3")
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "redis://localhost:6379/0")
+# Expired sessions removed by each write, and seconds between two runs of
+# the background reaper, 0 to only reap on writes
+REAP_BATCH = int(os.getenv("SESSION_REAP_BATCH", "16"))
+REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "0"))
+# Seconds over which the eviction rate is measured
+EVICTION_WINDOW = 60
+# Seconds the UserSession writes of touch and reap are kept in memory to
+# be written together, between two reads of the writes of other processes
+# on a hit (0 to read them on every lookup), and between two removals of
+# the expired UserSession objects
+DB_WRITE_BEHIND = float(os.getenv("SESSION_DB_WRITE_BEHIND", "0.5"))
+DB_REFRESH_INTERVAL = float(os.getenv("SESSION_DB_REFRESH_INTERVAL", "0"))
+DB_REAP_INTERVAL = float(os.getenv("SESSION_DB_REAP_INTERVAL", "60"))
+
+
+class SessionStore:
+    """
+    Interface of the session stores
+
+    A session record is any JSON-serializable value, stored under its
+    session ID. A record stored with a positive ttl is no longer returned
+    once ttl seconds have passed. Sessions stored with a user_id are also
+    indexed by user, so that the sessions of a user are found and removed
+    without a scan.
+    """
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """
+        Returns the record of a session, None if there is none
+        """
+        raise NotImplementedError()
+
+    def set(self, session_id: str, record: Any, ttl: int = 0,
+            user_id: str = None) -> None:
+        """
+        Stores the record of a session of user_id, for ttl seconds if
+        positive
+        """
+        raise NotImplementedError()
+
+    def user_sessions(self, user_id: str) -> List[str]:
+        """
+        Returns the session IDs of a user, oldest first
+        """
+        raise NotImplementedError()
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Removes the sessions of a user, returns their number
+        """
+        raise NotImplementedError()
+
+    def touch(self, session_id: str, ttl: int) -> bool:
+        """
+        Makes a session expire ttl seconds from now, returns whether it
+        exists
+        """
+        raise NotImplementedError()
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes a session, returns whether it existed
+        """
+        raise NotImplementedError()
+
+    def clear(self) -> None:
+        """
+        Removes every session
+        """
+        raise NotImplementedError()
+
+    def reap(self) -> int:
+        """
+        Removes the expired sessions, returns their number
+        """
+        return 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the number of live sessions and the eviction counters
+        """
+        return {}
+
+    def close(self) -> None:
+        """
+        Releases the resources held by the store
+        """
+
+
+class EvictionCounter:
+    """
+    Number of evicted sessions, in total and per second over the last
+    EVICTION_WINDOW seconds
+    """
+
+    def __init__(self):
+        """
+        Initializes the counter
+        """
+        self.total = 0
+        self._events = deque()
+
+    def add(self, count: int) -> None:
+        """
+        Counts count evictions
+        """
+        if count:
+            self.total += count
+            self._events.append((time.monotonic(), count))
+
+    def rate(self) -> float:
+        """
+        Returns the evictions per second over the window
+        """
+        start = time.monotonic() - EVICTION_WINDOW
+        while self._events and self._events[0][0] < start:
+            self._events.popleft()
+        return sum(count for _, count in self._events) / EVICTION_WINDOW
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Sessions in a dictionary of the current process
+
+    Expiry times are also kept in a heap, so that expired sessions are
+    found without a scan: each write removes up to REAP_BATCH of them,
+    and a background reaper runs every REAP_INTERVAL seconds if set.
+    Entries of the heap left behind by a later touch or delete are
+    skipped, and the heap is rebuilt once they outnumber the live ones.
+    Session IDs are indexed by user in insertion order.
+    """
+
+    def __init__(self, reap_interval: float = None):
+        """
+        Initializes an empty store
+        """
+        self.sessions = {}
+        self._expires_at = {}
+        self._heap = []
+        self._by_user = {}
+        self._user_of = {}
+        self._lock = threading.Lock()
+        self.evictions = EvictionCounter()
+        if reap_interval is None:
+            reap_interval = REAP_INTERVAL
+        self.reap_interval = reap_interval
+        if reap_interval > 0:
+            threading.Thread(target=self._reap_loop, daemon=True).start()
+
+    def _expire_at(self, session_id: str, expires_at: float) -> None:
+        """
+        Sets the expiry time of a session, under the lock
+        """
+        self._expires_at[session_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, session_id))
+        if len(self._heap) > 2 * len(self._expires_at) + 64:
+            self._heap = [(t, key) for key, t in self._expires_at.items()]
+            heapq.heapify(self._heap)
+
+    def _reap(self, limit: int = None) -> int:
+        """
+        Removes up to limit expired sessions, under the lock
+        """
+        now = time.monotonic()
+        count = 0
+        while self._heap and self._heap[0][0] <= now and \
+                (limit is None or count < limit):
+            expires_at, session_id = heapq.heappop(self._heap)
+            if self._expires_at.get(session_id) == expires_at:
+                self._delete(session_id)
+                count += 1
+        self.evictions.add(count)
+        return count
+
+    def _reap_loop(self) -> None:
+        """
+        Reaps every reap_interval seconds
+        """
+        while self.reap_interval > 0:
+            time.sleep(self.reap_interval)
+            self.reap()
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """
+        Returns the record of a session, None if there is none
+        """
+        expires_at = self._expires_at.get(session_id)
+        if expires_at is not None and expires_at <= time.monotonic():
+            return None
+        return self.sessions.get(session_id)
+
+    def _delete(self, session_id: str) -> bool:
+        """
+        Removes a session, under the lock
+        """
+        self._expires_at.pop(session_id, None)
+        user_id = self._user_of.pop(session_id, None)
+        if user_id is not None:
+            ids = self._by_user[user_id]
+            del ids[session_id]
+            if not ids:
+                del self._by_user[user_id]
+        return self.sessions.pop(session_id, None) is not None
+
+    def set(self, session_id: str, record: Any, ttl: int = 0,
+            user_id: str = None) -> None:
+        """
+        Stores the record of a session of user_id, for ttl seconds if
+        positive
+        """
+        with self._lock:
+            self._reap(REAP_BATCH)
+            self._delete(session_id)
+            self.sessions[session_id] = record
+            if ttl > 0:
+                self._expire_at(session_id, time.monotonic() + ttl)
+            if user_id is not None:
+                self._user_of[session_id] = user_id
+                self._by_user.setdefault(user_id, {})[session_id] = None
+
+    def user_sessions(self, user_id: str) -> List[str]:
+        """
+        Returns the session IDs of a user, oldest first
+        """
+        with self._lock:
+            return [session_id
+                    for session_id in self._by_user.get(user_id, ())
+                    if self.get(session_id) is not None]
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Removes the sessions of a user, returns their number
+        """
+        with self._lock:
+            session_ids = list(self._by_user.get(user_id, ()))
+            for session_id in session_ids:
+                self._delete(session_id)
+            return len(session_ids)
+
+    def touch(self, session_id: str, ttl: int) -> bool:
+        """
+        Makes a session expire ttl seconds from now, returns whether it
+        exists
+        """
+        with self._lock:
+            if self.get(session_id) is None:
+                return False
+            self._expire_at(session_id, time.monotonic() + ttl)
+            return True
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes a session, returns whether it existed
+        """
+        with self._lock:
+            return self._delete(session_id)
+
+    def clear(self) -> None:
+        """
+        Removes every session
+        """
+        with self._lock:
+            self.sessions.clear()
+            self._expires_at.clear()
+            self._heap = []
+            self._by_user.clear()
+            self._user_of.clear()
+
+    def reap(self) -> int:
+        """
+        Removes the expired sessions, returns their number
+        """
+        with self._lock:
+            return self._reap()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the number of live sessions and the eviction counters
+        """
+        with self._lock:
+            self._reap()
+            return {
+                "live": len(self.sessions),
+                "evicted": self.evictions.total,
+                "evictions_per_second": self.evictions.rate(),
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite database, shared by the processes of a host
+
+    Each thread has its own connection. The database is in WAL mode so
+    that lookups are not blocked by writes of other processes. Expiry
+    times are indexed: each write removes up to REAP_BATCH expired
+    sessions. User IDs are indexed too.
+    """
+
+    def __init__(self, db_path: str = None):
+        """
+        Initializes the store in the database file db_path
+        """
+        self.db_path = db_path or SESSION_STORE_PATH
+        self._local = threading.local()
+        self.evictions = EvictionCounter()
+        db = self._db()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, record TEXT NOT NULL, "
+            "expires_at REAL)")
+        columns = [row[1] for row in
+                   db.execute("PRAGMA table_info(sessions)")]
+        if "user_id" not in columns:
+            db.execute("ALTER TABLE sessions ADD COLUMN user_id TEXT")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at "
+                   "ON sessions (expires_at)")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_user_id "
+                   "ON sessions (user_id)")
+
+    def _db(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread
+        """
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30,
+                                 isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """
+        Returns the record of a session, None if there is none
+        """
+        row = self._db().execute(
+            "SELECT record FROM sessions WHERE session_id = ? AND "
+            "(expires_at IS NULL OR expires_at > ?)",
+            (session_id, time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, session_id: str, record: Any, ttl: int = 0,
+            user_id: str = None) -> None:
+        """
+        Stores the record of a session of user_id, for ttl seconds if
+        positive
+        """
+        expires_at = time.time() + ttl if ttl > 0 else None
+        self._reap(REAP_BATCH)
+        self._db().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, record, "
+            "expires_at, user_id) VALUES (?, ?, ?, ?)",
+            (session_id, json.dumps(record), expires_at, user_id))
+
+    def user_sessions(self, user_id: str) -> List[str]:
+        """
+        Returns the session IDs of a user, oldest first
+        """
+        rows = self._db().execute(
+            "SELECT session_id FROM sessions WHERE user_id = ? AND "
+            "(expires_at IS NULL OR expires_at > ?) ORDER BY rowid",
+            (user_id, time.time()))
+        return [row[0] for row in rows]
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Removes the sessions of a user, returns their number
+        """
+        cursor = self._db().execute(
+            "DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        return cursor.rowcount
+
+    def touch(self, session_id: str, ttl: int) -> bool:
+        """
+        Makes a session expire ttl seconds from now, returns whether it
+        exists
+        """
+        now = time.time()
+        cursor = self._db().execute(
+            "UPDATE sessions SET expires_at = ? WHERE session_id = ? AND "
+            "(expires_at IS NULL OR expires_at > ?)",
+            (now + ttl, session_id, now))
+        return cursor.rowcount > 0
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes a session, returns whether it existed
+        """
+        cursor = self._db().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def clear(self) -> None:
+        """
+        Removes every session
+        """
+        self._db().execute("DELETE FROM sessions")
+
+    def _reap(self, limit: int = -1) -> int:
+        """
+        Removes up to limit expired sessions, all if negative
+        """
+        cursor = self._db().execute(
+            "DELETE FROM sessions WHERE session_id IN (SELECT session_id "
+            "FROM sessions WHERE expires_at <= ? LIMIT ?)",
+            (time.time(), limit))
+        self.evictions.add(cursor.rowcount)
+        return cursor.rowcount
+
+    def reap(self) -> int:
+        """
+        Removes the expired sessions, returns their number
+        """
+        return self._reap()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the number of live sessions and the eviction counters of
+        this process
+        """
+        live, = self._db().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at IS NULL OR "
+            "expires_at > ?", (time.time(),)).fetchone()
+        return {
+            "live": live,
+            "evicted": self.evictions.total,
+            "evictions_per_second": self.evictions.rate(),
+        }
+
+    def close(self) -> None:
+        """
+        Closes the connection of the current thread
+        """
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+class RedisError(Exception):
+    """
+    Error reply of a Redis server
+    """
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions in a Redis server, shared by every process and host
+
+    Speaks the Redis protocol (RESP) directly over a socket, so no client
+    library is needed. Sessions are stored under "session:<id>" and their
+    ttl is left to the server. The session IDs of a user are kept in the
+    sorted set "user_sessions:<user id>", scored by creation time; IDs of
+    sessions gone since are dropped from it when it is read.
+    """
+
+    prefix = "session:"
+    user_prefix = "user_sessions:"
+
+    def __init__(self, url: str = None):
+        """
+        Initializes the store for the server at url
+        """
+        url = urlparse(url or SESSION_STORE_URL)
+        self.host = url.hostname or "localhost"
+        self.port = url.port or 6379
+        self.db = int(url.path.strip("/") or 0)
+        self._lock = threading.Lock()
+        self._sock = None
+        self._reader = None
+
+    def _connect(self) -> None:
+        """
+        Opens the connection and selects the database
+        """
+        self._sock = socket.create_connection((self.host, self.port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        if self.db:
+            self._send("SELECT", self.db)
+            self._reply()
+
+    def _send(self, *args) -> None:
+        """
+        Sends a command as an array of bulk strings
+        """
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._sock.sendall(b"".join(parts))
+
+    def _reply(self) -> Any:
+        """
+        Reads one reply
+        """
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by the server")
+        kind, data = line[:1], line[1:-2]
+        if kind == b"+":
+            return data.decode()
+        if kind == b"-":
+            raise RedisError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            if int(data) < 0:
+                return None
+            return self._reader.read(int(data) + 2)[:-2]
+        if kind == b"*":
+            if int(data) < 0:
+                return None
+            return [self._reply() for _ in range(int(data))]
+        raise RedisError("unknown reply {!r}".format(line))
+
+    def execute(self, *args) -> Any:
+        """
+        Runs a command and returns its reply, reconnecting once if the
+        connection was lost
+        """
+        with self._lock:
+            for attempt in (0, 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._send(*args)
+                    return self._reply()
+                except (ConnectionError, OSError):
+                    self.close()
+                    if attempt:
+                        raise
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """
+        Returns the record of a session, None if there is none
+        """
+        data = self.execute("GET", self.prefix + session_id)
+        return None if data is None else json.loads(data)
+
+    def set(self, session_id: str, record: Any, ttl: int = 0,
+            user_id: str = None) -> None:
+        """
+        Stores the record of a session of user_id, for ttl seconds if
+        positive
+        """
+        args = ["SET", self.prefix + session_id, json.dumps(record)]
+        if ttl > 0:
+            args += ["PX", int(ttl * 1000)]
+        self.execute(*args)
+        if user_id is not None:
+            key = self.user_prefix + user_id
+            # No TTL on the set: touch extends sessions past the TTL they
+            # were created with, and members whose session has expired
+            # are pruned by user_sessions
+            self.execute("ZADD", key, repr(time.time()), session_id)
+
+    def user_sessions(self, user_id: str) -> List[str]:
+        """
+        Returns the session IDs of a user, oldest first
+        """
+        key = self.user_prefix + user_id
+        session_ids = [session_id.decode() for session_id in
+                       self.execute("ZRANGE", key, 0, -1)]
+        if not session_ids:
+            return []
+        records = self.execute("MGET", *[self.prefix + session_id
+                                         for session_id in session_ids])
+        gone = [session_id for session_id, record
+                in zip(session_ids, records) if record is None]
+        if gone:
+            self.execute("ZREM", key, *gone)
+        return [session_id for session_id, record
+                in zip(session_ids, records) if record is not None]
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Removes the sessions of a user, returns their number
+        """
+        key = self.user_prefix + user_id
+        session_ids = self.execute("ZRANGE", key, 0, -1)
+        if not session_ids:
+            return 0
+        count = self.execute("DEL", *[self.prefix.encode() + session_id
+                                      for session_id in session_ids])
+        self.execute("DEL", key)
+        return count
+
+    def touch(self, session_id: str, ttl: int) -> bool:
+        """
+        Makes a session expire ttl seconds from now, returns whether it
+        exists
+        """
+        return self.execute("PEXPIRE", self.prefix + session_id,
+                            int(ttl * 1000)) == 1
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes a session, returns whether it existed
+        """
+        return self.execute("DEL", self.prefix + session_id) > 0
+
+    def _scan(self):
+        """
+        Yields the keys of the sessions, by batches
+        """
+        cursor = "0"
+        while True:
+            cursor, keys = self.execute("SCAN", cursor, "MATCH",
+                                        self.prefix + "*", "COUNT", 1000)
+            if keys:
+                yield keys
+            if cursor in (b"0", "0"):
+                return
+
+    def clear(self) -> None:
+        """
+        Removes every session
+        """
+        for keys in self._scan():
+            self.execute("DEL", *keys)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the number of live sessions, expired sessions being
+        evicted by the server
+        """
+        return {"live": sum(len(keys) for keys in self._scan())}
+
+    def close(self) -> None:
+        """
+        Closes the connection
+        """
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._reader = None
+
+
+class UserSessionStore(SessionStore):
+    """
+    Sessions stored on disk as UserSession objects
+
+    Records are dictionaries holding the user_id of the session, or the
+    bare user ID stored by SessionAuth; get always returns the dictionary
+    form. Lookups go through the session_id and user_id indexes of
+    UserSession, never a scan.
+
+    New and deleted sessions are written to the log of UserSession right
+    away, so that other workers see them on their next lookup. Only the
+    new expiry times of touch are kept in memory and written together
+    every DB_WRITE_BEHIND seconds. The writes of other processes are read
+    from the log on a miss, and at least every DB_REFRESH_INTERVAL
+    seconds on a hit.
+
+    Expiry times, including the ones read from other processes, are also
+    kept in a heap, so that expired sessions are found without a scan.
+    They are removed together, in a single write, every DB_REAP_INTERVAL
+    seconds. Entries of the heap left behind by a later touch or delete
+    are skipped, and the heap is rebuilt once they outnumber the
+    sessions.
+    """
+
+    def __init__(self, write_behind: float = None):
+        """
+        Initializes the store from the UserSession file
+        """
+        UserSession.load_from_file()
+        if write_behind is None:
+            write_behind = DB_WRITE_BEHIND
+        UserSession.store().write_behind = write_behind
+        self._lock = threading.RLock()
+        self._refreshed_at = time.monotonic()
+        self._reaped_at = time.monotonic()
+        self._heap = []
+        self._rebuild_heap()
+        self.evictions = EvictionCounter()
+
+    @staticmethod
+    def _expires_at_of(obj) -> Optional[float]:
+        """
+        Returns the expiry time of a UserSession or of its JSON dictionary
+        """
+        if type(obj) is dict:
+            return obj.get("expires_at")
+        return obj.expires_at
+
+    def _rebuild_heap(self) -> None:
+        """
+        Rebuilds the expiry heap from every UserSession, under the lock
+        """
+        self._heap = []
+        for obj_id, obj in dict.items(DATA[UserSession.__name__]):
+            expires_at = self._expires_at_of(obj)
+            if expires_at is not None:
+                self._heap.append((expires_at, obj_id))
+        heapq.heapify(self._heap)
+
+    def _expire_at(self, obj_id: str, expires_at: Optional[float]) -> None:
+        """
+        Adds the expiry time of a UserSession to the heap, under the lock
+        """
+        if expires_at is None:
+            return
+        heapq.heappush(self._heap, (expires_at, obj_id))
+        if len(self._heap) > 2 * UserSession.count() + 64:
+            self._rebuild_heap()
+
+    def _write(self) -> None:
+        """
+        Writes the UserSession writes kept in memory to the log, where
+        other processes read them
+        """
+        UserSession.store().flush(durable=False)
+
+    def refresh(self) -> None:
+        """
+        Reads the writes of other processes
+        """
+        with self._lock:
+            records = UserSession.refresh_from_file()
+            if records is None:
+                self._rebuild_heap()
+            else:
+                for record in records:
+                    if record.get("op") == "save":
+                        self._expire_at(record["obj"]["id"],
+                                        record["obj"].get("expires_at"))
+                    elif record.get("op") == "update":
+                        self._expire_at(record["id"],
+                                        record["fields"].get("expires_at"))
+            self._refreshed_at = time.monotonic()
+
+    def _find(self, session_id: str,
+              refresh: bool = True) -> Optional[UserSession]:
+        """
+        Returns the UserSession of a session ID, expired or not, reading
+        the writes of other processes first if refresh is set
+        """
+        refreshed = False
+        if refresh and \
+                time.monotonic() - self._refreshed_at >= DB_REFRESH_INTERVAL:
+            self.refresh()
+            refreshed = True
+        user_sessions = UserSession.search({"session_id": session_id})
+        if refresh and not refreshed and not user_sessions:
+            self.refresh()
+            user_sessions = UserSession.search({"session_id": session_id})
+        return user_sessions[0] if user_sessions else None
+
+    @staticmethod
+    def _expired(expires_at: Optional[float], now: float) -> bool:
+        """
+        Tells whether a session expiring at expires_at is expired at now
+        """
+        return expires_at is not None and expires_at <= now
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """
+        Returns the record of a session, None if there is none
+        """
+        with self._lock:
+            user_session = self._find(session_id)
+            if user_session is None or \
+                    self._expired(user_session.expires_at, time.time()):
+                return None
+            created_at = user_session.created_at
+            return {
+                "user_id": user_session.user_id,
+                "created_at": created_at.replace(
+                    tzinfo=timezone.utc).timestamp(),
+            }
+
+    def set(self, session_id: str, record: dict, ttl: int = 0,
+            user_id: str = None) -> None:
+        """
+        Stores the record of a session, for ttl seconds if positive. The
+        user ID is the one of the record, or the record itself if it is
+        not a dictionary.
+        """
+        expires_at = time.time() + ttl if ttl > 0 else None
+        with self._lock:
+            if time.monotonic() - self._reaped_at >= DB_REAP_INTERVAL:
+                self.reap()
+            user_session = self._find(session_id, refresh=False)
+            if user_session is None:
+                user_session = UserSession(session_id=session_id)
+            if isinstance(record, dict):
+                user_session.user_id = record["user_id"]
+            else:
+                user_session.user_id = record
+            user_session.expires_at = expires_at
+            user_session.save()
+            self._write()
+            self._expire_at(user_session.id, expires_at)
+
+    def touch(self, session_id: str, ttl: int) -> bool:
+        """
+        Makes a session expire ttl seconds from now, returns whether it
+        exists
+        """
+        now = time.time()
+        with self._lock:
+            user_session = self._find(session_id)
+            if user_session is None or \
+                    self._expired(user_session.expires_at, now):
+                return False
+            user_session.expires_at = now + ttl
+            # Not a save: a late write must not bring back a session
+            # deleted by another worker before the flush
+            user_session.save_fields("expires_at")
+            self._expire_at(user_session.id, user_session.expires_at)
+            return True
+
+    def _user_sessions(self, user_id: str) -> List[UserSession]:
+        """
+        Returns the UserSession objects of a user, oldest first
+        """
+        self.refresh()
+        now = time.time()
+        user_sessions = [
+            user_session for user_session in
+            UserSession.search({"user_id": user_id})
+            if not self._expired(user_session.expires_at, now)]
+        user_sessions.sort(key=lambda user_session: (
+            user_session.created_at, user_session.expires_at or 0))
+        return user_sessions
+
+    def user_sessions(self, user_id: str) -> List[str]:
+        """
+        Returns the session IDs of a user, oldest first
+        """
+        with self._lock:
+            return [user_session.session_id
+                    for user_session in self._user_sessions(user_id)]
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Removes the sessions of a user with a single write, returns their
+        number
+        """
+        with self._lock, UserSession.batch():
+            user_sessions = self._user_sessions(user_id)
+            for user_session in user_sessions:
+                user_session.remove()
+            return len(user_sessions)
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes a session, returns whether it existed
+        """
+        with self._lock:
+            user_session = self._find(session_id)
+            if user_session is None:
+                return False
+            user_session.remove()
+            self._write()
+            return True
+
+    def clear(self) -> None:
+        """
+        Removes every session
+        """
+        with self._lock, UserSession.batch():
+            for user_session in UserSession.all():
+                user_session.remove()
+            self._heap = []
+
+    def reap(self) -> int:
+        """
+        Removes the expired sessions with a single write, returns their
+        number
+        """
+        now = time.time()
+        with self._lock:
+            self._reaped_at = time.monotonic()
+            objs = DATA[UserSession.__name__]
+            expired = {}
+            while self._heap and self._expired(self._heap[0][0], now):
+                expires_at, obj_id = heapq.heappop(self._heap)
+                obj = dict.get(objs, obj_id)
+                if obj is not None and \
+                        self._expires_at_of(obj) == expires_at:
+                    expired[obj_id] = None
+            with UserSession.batch():
+                for obj_id in expired:
+                    objs[obj_id].remove()
+            self.evictions.add(len(expired))
+            return len(expired)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the number of live sessions and the eviction counters of
+        this process
+        """
+        with self._lock:
+            self.reap()
+            return {
+                "live": UserSession.count(),
+                "evicted": self.evictions.total,
+                "evictions_per_second": self.evictions.rate(),
+            }
+
+    def close(self) -> None:
+        """
+        Writes the sessions kept in memory
+        """
+        UserSession.flush()
+
+
+STORES = {
+    "memory": MemorySessionStore,
+    "sqlite": SQLiteSessionStore,
+    "redis": RedisSessionStore,
+}
+_store = None
+_store_lock = threading.Lock()
+
+
+_user_session_store = None
+
+
+def get_session_store() -> SessionStore:
+    """
+    Returns the session store of the process, built on first use from
+    SESSION_STORE
+    """
+    global _store
+    if _store is None:
+        if SESSION_STORE == "db":
+            return get_user_session_store()
+        with _store_lock:
+            if _store is None:
+                if SESSION_STORE not in STORES:
+                    raise ValueError("unknown SESSION_STORE {!r}".format(
+                        SESSION_STORE))
+                _store = STORES[SESSION_STORE]()
+    return _store
+
+
+def get_user_session_store() -> UserSessionStore:
+    """
+    Returns the UserSession store of the process, built on first use
+    """
+    global _user_session_store
+    if _user_session_store is None:
+        with _store_lock:
+            if _user_session_store is None:
+                _user_session_store = UserSessionStore()
+    return _user_session_store
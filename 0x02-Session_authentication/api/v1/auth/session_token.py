@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Session token module
+
+Stateless session IDs: a token carries the user ID and the expiry time
+of its session, signed with HMAC-SHA256, so the store holds no record
+of the sessions, only of the tokens revoked before their expiry.
+Enabled with SESSION_TOKENS=true.
+
+Signing keys are listed in SESSION_TOKEN_KEYS as "version:secret" pairs
+separated by commas, e.g. "1:oldsecret,2:newsecret". New tokens are
+signed with the highest version, tokens of the other listed versions
+are still accepted: to rotate keys, add a version, then drop the old one
+once its tokens have expired. Every worker must be given the same keys;
+without any, each process uses a random key of its own.
+
+Tokens revoked by destroy_session are recorded in the session store of
+the authentication (see api.v1.auth.session_store) until they expire,
+so that every worker sharing the store rejects them. Checking a token
+thus costs one store lookup; with the memory backend, revocations only
+reach the process that recorded them.
+"""
+import base64
+import binascii
+import hmac
+import os
+import secrets
+import struct
+import math
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from api.v1.auth.session_store import (MemorySessionStore, SessionStore,
+                                       get_session_store)
+
+
+SESSION_TOKENS = os.getenv("SESSION_TOKENS", "").lower() in ("1", "true")
+SESSION_TOKEN_KEYS = os.getenv("SESSION_TOKEN_KEYS", "")
+# Lifetime in seconds of tokens of sessions that do not expire otherwise
+SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", "86400"))
+
+# Key version, expiry time, user ID kind and token ID
+HEADER = struct.Struct(">HIB8s")
+SIGNATURE_SIZE = 16
+USER_ID_UUID = 1
+USER_ID_TEXT = 0
+# Prefix of the keys of revoked tokens in the session store
+REVOKED_PREFIX = "revoked:"
+
+
+def parse_keys(keys: str) -> Dict[int, bytes]:
+    """
+    Returns the signing keys by version of a SESSION_TOKEN_KEYS value
+    """
+    parsed = {}
+    for pair in keys.split(","):
+        if not pair.strip():
+            continue
+        version, secret = pair.strip().split(":", 1)
+        parsed[int(version)] = secret.encode()
+    return parsed
+
+
+def _b64encode(data: bytes) -> str:
+    """
+    Returns data in unpadded URL-safe Base64
+    """
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    """
+    Decodes unpadded URL-safe Base64
+    """
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class TokenSigner:
+    """
+    Signs and checks session tokens, and records the tokens revoked
+    before their expiry in a session store
+
+    A token is the URL-safe Base64 encoding of a header (key version,
+    expiry time, token ID), the user ID (16 bytes when it is a UUID) and
+    the first SIGNATURE_SIZE bytes of the HMAC-SHA256 of all of it: 63
+    characters for a UUID user ID.
+    """
+
+    def __init__(self, keys: Dict[int, bytes] = None, ttl: int = None,
+                 store: SessionStore = None):
+        """
+        Initializes the signer with keys by version, recording revoked
+        tokens in store, or in a store of its own if not given
+        """
+        if keys is None:
+            keys = parse_keys(SESSION_TOKEN_KEYS)
+        if not keys:
+            keys = {1: secrets.token_bytes(32)}
+        self._keys = dict(keys)
+        self.version = max(self._keys)
+        self.ttl = SESSION_TOKEN_TTL if ttl is None else ttl
+        if store is None:
+            store = MemorySessionStore(reap_interval=0)
+        self.store = store
+
+    def rotate(self, key: bytes = None) -> int:
+        """
+        Signs new tokens with a new key, random if not given, returns its
+        version
+        """
+        self.version += 1
+        self._keys[self.version] = key or secrets.token_bytes(32)
+        return self.version
+
+    def retire(self, version: int) -> None:
+        """
+        Drops a key other than the current one, rejecting its tokens
+        """
+        if version != self.version:
+            self._keys.pop(version, None)
+
+    def _signature(self, key: bytes, payload: bytes) -> bytes:
+        """
+        Returns the signature of payload
+        """
+        return hmac.digest(key, payload, "sha256")[:SIGNATURE_SIZE]
+
+    def sign(self, user_id: str, ttl: int = 0) -> str:
+        """
+        Returns a token for a session of user_id lasting ttl seconds, or
+        the default token lifetime if not positive
+        """
+        expires_at = int(time.time()) + (ttl if ttl > 0 else self.ttl)
+        try:
+            user_uuid = uuid.UUID(user_id)
+        except ValueError:
+            user_uuid = None
+        if user_uuid is not None and str(user_uuid) == user_id:
+            kind, user_bytes = USER_ID_UUID, user_uuid.bytes
+        else:
+            kind, user_bytes = USER_ID_TEXT, user_id.encode()
+        payload = HEADER.pack(self.version, expires_at, kind,
+                              secrets.token_bytes(8)) + user_bytes
+        key = self._keys[self.version]
+        return _b64encode(payload + self._signature(key, payload))
+
+    def _decode(self, token: str) -> Optional[Tuple[str, int, bytes]]:
+        """
+        Returns the user ID, expiry time and token ID of a token that is
+        well signed and not expired, None otherwise
+        """
+        try:
+            data = _b64decode(token)
+        except (binascii.Error, ValueError):
+            return None
+        if len(data) < HEADER.size + SIGNATURE_SIZE:
+            return None
+        payload, signature = data[:-SIGNATURE_SIZE], data[-SIGNATURE_SIZE:]
+        version, expires_at, kind, token_id = HEADER.unpack_from(payload)
+        key = self._keys.get(version)
+        if key is None or not hmac.compare_digest(
+                self._signature(key, payload), signature):
+            return None
+        if expires_at <= time.time():
+            return None
+        user_bytes = payload[HEADER.size:]
+        if kind == USER_ID_UUID:
+            user_id = str(uuid.UUID(bytes=user_bytes))
+        else:
+            user_id = user_bytes.decode()
+        return user_id, expires_at, token_id
+
+    def verify(self, token: str) -> Optional[str]:
+        """
+        Returns the user ID of a valid token, None if it is forged,
+        expired, signed with an unknown key or revoked
+        """
+        decoded = self._decode(token)
+        if decoded is None or \
+                self.store.get(REVOKED_PREFIX + decoded[2].hex()) is not None:
+            return None
+        return decoded[0]
+
+    def revoke(self, token: str) -> bool:
+        """
+        Rejects a valid token until it expires, returns whether it was
+        valid
+        """
+        decoded = self._decode(token)
+        if decoded is None:
+            return False
+        _, expires_at, token_id = decoded
+        key = REVOKED_PREFIX + token_id.hex()
+        if self.store.get(key) is not None:
+            return False
+        # Kept until the token expires, not listed among the user sessions
+        self.store.set(key, {"user_id": None},
+                       max(1, math.ceil(expires_at - time.time())))
+        return True
+
+
+_keys = None
+_signers = {}
+_signer_lock = threading.Lock()
+
+
+def get_token_signer(store: SessionStore = None) -> Optional[TokenSigner]:
+    """
+    Returns the token signer of the process recording revocations in
+    store, the one of SESSION_STORE if not given, None unless
+    SESSION_TOKENS is set
+
+    The signers of a process all use the same keys, so that a token
+    signed by one is accepted by the others.
+    """
+    global _keys
+    if not SESSION_TOKENS:
+        return None
+    if store is None:
+        store = get_session_store()
+    signer = _signers.get(store)
+    if signer is None:
+        with _signer_lock:
+            signer = _signers.get(store)
+            if signer is None:
+                if _keys is None:
+                    _keys = parse_keys(SESSION_TOKEN_KEYS) or \
+                        {1: secrets.token_bytes(32)}
+                signer = TokenSigner(_keys, store=store)
+                _signers[store] = signer
+    return signer
@@ -18,10 +18,14 @@ def stats() -> str:
     """ GET /api/v1/stats
     Return:
       - the number of each objects
+      - the live sessions and the session eviction rate
     """
     from models.user import User
+    from api.v1.views.session_auth import get_session_auth
     stats = {}
     stats['users'] = User.count()
+    # The store the sessions of the app are kept in
+    stats['sessions'] = get_session_auth().store.stats()
     return jsonify(stats)
 
 
@@ -10,11 +10,20 @@ from api.v1.auth.session_auth import SessionAuth
 from models.user import User
 import logging
 
-auth = SessionAuth()
+_auth = SessionAuth()
 
 logging.basicConfig(level=logging.DEBUG)
 
 
+def get_session_auth() -> SessionAuth:
+    """
+    Returns the authentication of the app if session based, so that
+    sessions are created where they are looked up
+    """
+    from api.v1.app import auth
+    return auth if isinstance(auth, SessionAuth) else _auth
+
+
 @app_views.route('/auth_session/login', methods=['POST'], strict_slashes=False)
 def login():
     """
@@ -40,7 +49,7 @@ def login():
     if not user.is_valid_password(password):
         return jsonify({"error": "wrong password"}), 401
 
-    session_id = auth.create_session(user.id)
+    session_id = get_session_auth().create_session(user.id)
     logging.debug(f'Session ID created: {session_id}')
 
     response = jsonify(user.to_json())
@@ -58,7 +67,7 @@ def logout():
     """
     logging.debug('Logout attempt')
 
-    if not auth.destroy_session(request):
+    if not get_session_auth().destroy_session(request):
         abort(404)
 
     logging.debug('Logout successful')
@@ -2,18 +2,64 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, jsonify, request, Response
 from models.user import User
+import json
+
+
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+
+def stream_users():
+    """ Yield the JSON list of all users, STREAM_CHUNK_SIZE at a time
+    """
+    yield '['
+    after = None
+    first = True
+    while True:
+        users = User.page(after, STREAM_CHUNK_SIZE)
+        if not users:
+            break
+        chunk = ', '.join(json.dumps(user.to_json()) for user in users)
+        yield chunk if first else ', ' + chunk
+        first = False
+        after = users[-1].id
+    yield ']'
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): number of users per page, ordered by ID
+      - after (optional): ID of the last user of the previous page
+      - stream (optional): "1" to stream all users in chunks
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, or one page of them
+        with the cursor of the next page in the X-Next-After header
+      - 400 if limit isn't a number between 1 and MAX_PAGE_SIZE
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    if limit is None and after is None:
+        if request.args.get('stream') == '1':
+            return Response(stream_users(), mimetype='application/json')
+        return Response(User.all_json(), mimetype='application/json')
+
+    try:
+        limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': "limit must be between 1 and {}".format(
+            MAX_PAGE_SIZE)}), 400
+
+    users = User.page(after, limit + 1)
+    response = jsonify([user.to_json() for user in users[:limit]])
+    if len(users) > limit:
+        response.headers['X-Next-After'] = users[limit - 1].id
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -46,18 +92,81 @@ def delete_user(user_id: str = None) -> str:
     Path parameter:
       - User ID
     Return:
-      - empty JSON is the User has been correctly deleted
+      - empty JSON is the User has been correctly deleted, its sessions
+        are destroyed too
       - 404 if the User ID doesn't exist
     """
+    from api.v1.views.session_auth import get_session_auth
     if user_id is None:
         abort(404)
     user = User.get(user_id)
     if user is None:
         abort(404)
     user.remove()
+    get_session_auth().destroy_user_sessions(user.id)
     return jsonify({}), 200
 
 
+def session_owner(user_id: str) -> User:
+    """ Return the user of user_id ("me" for the current user) whose
+    sessions are requested, aborting unless it is the current user
+
+    Session IDs are credentials: without an authenticated user, the
+    request is refused rather than let through.
+    """
+    current_user = getattr(request, 'current_user', None)
+    if current_user is None:
+        abort(401)
+    if user_id == "me":
+        return current_user
+    user = User.get(user_id)
+    if user is None:
+        abort(404)
+    if current_user.id != user.id:
+        abort(403)
+    return user
+
+
+@app_views.route('/users/<user_id>/sessions', methods=['GET'],
+                 strict_slashes=False)
+def view_user_sessions(user_id: str = None) -> str:
+    """ GET /api/v1/users/:id/sessions
+    Path parameter:
+      - User ID, or "me"
+    Return:
+      - list of the session IDs of the User, oldest first
+      - 401 if no User is authenticated
+      - 403 if the User isn't the authenticated one
+      - 404 if the User ID doesn't exist
+    """
+    from api.v1.views.session_auth import get_session_auth
+    user = session_owner(user_id)
+    return jsonify(get_session_auth().user_sessions(user.id))
+
+
+@app_views.route('/users/<user_id>/sessions', methods=['DELETE'],
+                 strict_slashes=False)
+def delete_user_sessions(user_id: str = None) -> str:
+    """ DELETE /api/v1/users/:id/sessions
+    Path parameter:
+      - User ID, or "me"
+    Return:
+      - the number of sessions of the User destroyed
+      - 401 if no User is authenticated
+      - 403 if the User isn't the authenticated one
+      - 404 if the User ID doesn't exist
+      - 501 with signed session tokens, which can't be destroyed by User
+    """
+    from api.v1.views.session_auth import get_session_auth
+    user = session_owner(user_id)
+    session_auth = get_session_auth()
+    if session_auth.tokens is not None:
+        # Nothing would be destroyed: don't report success
+        return jsonify({"error": "Not implemented with session tokens"}), 501
+    count = session_auth.destroy_user_sessions(user.id)
+    return jsonify({"destroyed": count}), 200
+
+
 @app_views.route('/users', methods=['POST'], strict_slashes=False)
 def create_user() -> str:
     """ POST /api/v1/users/
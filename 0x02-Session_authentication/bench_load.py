@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+""" Startup benchmark: time to first request against the number of users
+
+Usage: ./bench_load.py [users ...]
+
+For each size, writes a .db_User.json file in a temporary directory and
+measures User.load_from_file() followed by the work of a first request
+(a search by email and a to_json), with lazy hydration and with every
+object built eagerly as before.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from models.base import DATA, STORES, close_stores
+from models.user import User
+
+
+def write_users(count: int):
+    """ Write a snapshot of count users in the current directory
+    """
+    objs_json = {}
+    for i in range(count):
+        obj_id = str(uuid.uuid4())
+        objs_json[obj_id] = {
+            "id": obj_id,
+            "created_at": "2024-06-09T14:19:40",
+            "updated_at": "2024-06-09T14:19:40",
+            "email": "user{}@hbtn.io".format(i),
+            "_password": "a5c904771b8617de27d3511d1f5380",
+            "first_name": None,
+            "last_name": None,
+        }
+    with open(".db_User.json", "w") as f:
+        json.dump(objs_json, f)
+
+
+def first_request(count: int, eager: bool) -> float:
+    """ Return the seconds from load_from_file to a first answer
+    """
+    start = time.perf_counter()
+    User.load_from_file()
+    if eager:
+        for user in DATA["User"].values():
+            user.created_at, user.updated_at
+    user = User.search({"email": "user{}@hbtn.io".format(count // 2)})[0]
+    user.to_json()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    cwd = os.getcwd()
+    print("{:>8} {:>10} {:>10}".format("users", "eager ms", "lazy ms"))
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            write_users(count)
+            eager = first_request(count, True)
+            lazy = first_request(count, False)
+            close_stores()
+            STORES.clear()
+            os.chdir(cwd)
+        print("{:>8} {:>10.1f} {:>10.1f}".format(
+            count, eager * 1000, lazy * 1000))
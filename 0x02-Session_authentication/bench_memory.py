@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+""" Memory benchmark: bytes per User before and after __slots__
+
+Usage: ./bench_memory.py [users]
+
+"before" mimics the former layout, a per-instance __dict__ holding the
+id, two datetime objects and the user fields. "after" is models.user.User
+with its __slots__, built from JSON the way load_from_file builds them,
+with both timestamps read so that they are parsed as in "before": the
+two rows differ by __slots__ only. "lazy" is the same User with its
+timestamps left unread, kept as the strings of the JSON.
+"""
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from models.user import User
+
+
+class DictUser():
+    """ Former User layout, attributes in a __dict__
+    """
+
+    def __init__(self, **kwargs):
+        """ Initialize like the former Base and User did
+        """
+        self.id = kwargs.get('id')
+        self.created_at = datetime.strptime(kwargs.get('created_at'),
+                                            "%Y-%m-%dT%H:%M:%S")
+        self.updated_at = datetime.strptime(kwargs.get('updated_at'),
+                                            "%Y-%m-%dT%H:%M:%S")
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+def users_json(count: int) -> list:
+    """ Return the JSON dictionaries of count users
+    """
+    return [{
+        "id": str(uuid.uuid4()),
+        "created_at": "2024-06-09T14:19:40",
+        "updated_at": "2024-06-09T14:19:40",
+        "email": "user{}@hbtn.io".format(i),
+        "_password": "a5c904771b8617de27d3511d1f538094"
+                     "e26c120da663363b3f760f7b894f9d69",
+        "first_name": None,
+        "last_name": None,
+    } for i in range(count)]
+
+
+def bytes_per_user(cls: type, objs_json: list,
+                   parse: bool = True) -> float:
+    """ Return the memory allocated per object of cls, with its
+    timestamps parsed if parse is set
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [cls(**obj_json) for obj_json in objs_json]
+    if parse:
+        for obj in objs:
+            obj.created_at, obj.updated_at
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return (after - before) / len(objs_json)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    objs_json = users_json(count)
+    before = bytes_per_user(DictUser, objs_json)
+    after = bytes_per_user(User, objs_json)
+    lazy = bytes_per_user(User, objs_json, parse=False)
+    print("{} users".format(count))
+    print("before: {:.0f} bytes/user".format(before))
+    print("after:  {:.0f} bytes/user".format(after))
+    print("lazy:   {:.0f} bytes/user".format(lazy))
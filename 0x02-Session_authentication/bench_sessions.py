@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+""" Session store benchmark: lookup latency of each backend
+
+Usage: ./bench_sessions.py [sessions] [lookups] [redis_url]
+
+Stores the given number of sessions in each backend, then times lookups
+of random session IDs. The redis backend runs against the in-process
+FakeRedisServer unless the URL of a real server is given. "token" rows
+time the check of signed session tokens against each backend: the
+signature, then the lookup of the token among the revoked ones, a tenth
+of the tokens being revoked.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from api.v1.auth.session_store import (MemorySessionStore,
+                                       RedisSessionStore,
+                                       SQLiteSessionStore)
+from api.v1.auth.session_token import TokenSigner
+from fake_redis import FakeRedisServer
+
+
+def lookup_latencies(store, sessions: int, lookups: int) -> list:
+    """ Return the seconds taken by each of lookups random lookups
+    """
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    for session_id in session_ids:
+        store.set(session_id, {"user_id": session_id,
+                               "created_at": time.time()})
+    latencies = []
+    for _ in range(lookups):
+        session_id = random.choice(session_ids)
+        start = time.perf_counter()
+        store.get(session_id)
+        latencies.append(time.perf_counter() - start)
+    store.clear()
+    return sorted(latencies)
+
+
+def token_latencies(store, sessions: int, lookups: int) -> list:
+    """ Return the seconds taken by each of lookups random token checks,
+    revocations being recorded in store
+    """
+    signer = TokenSigner(store=store)
+    tokens = [signer.sign(str(uuid.uuid4())) for _ in range(sessions)]
+    for token in tokens[::10]:
+        signer.revoke(token)
+    latencies = []
+    for _ in range(lookups):
+        token = random.choice(tokens)
+        start = time.perf_counter()
+        signer.verify(token)
+        latencies.append(time.perf_counter() - start)
+    store.clear()
+    return sorted(latencies)
+
+
+def percentile(latencies: list, p: float) -> float:
+    """ Return the p-th percentile of sorted latencies, in microseconds
+    """
+    return latencies[min(len(latencies) - 1,
+                         int(len(latencies) * p / 100))] * 1e6
+
+
+if __name__ == "__main__":
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    redis_url = sys.argv[3] if len(sys.argv) > 3 else None
+    server = None
+    if redis_url is None:
+        server = FakeRedisServer().start()
+        redis_url = server.url
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = [
+            ("memory", MemorySessionStore()),
+            ("sqlite", SQLiteSessionStore(os.path.join(tmp, "s.sqlite3"))),
+            ("redis", RedisSessionStore(redis_url)),
+        ]
+        print("{} sessions, {} lookups".format(sessions, lookups))
+        print("{:>12} {:>10} {:>10} {:>10}".format(
+            "backend", "p50 us", "p99 us", "mean us"))
+        results = []
+        for name, store in stores:
+            results.append((name, lookup_latencies(store, sessions,
+                                                   lookups)))
+            results.append(("token/" + name,
+                            token_latencies(store, sessions, lookups)))
+            store.close()
+        for name, latencies in results:
+            print("{:>12} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                name, percentile(latencies, 50), percentile(latencies, 99),
+                sum(latencies) / len(latencies) * 1e6))
+    if server is not None:
+        server.stop()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Fake Redis server module
+
+A small in-process server speaking the Redis protocol, with the
+commands used by RedisSessionStore. It lets the Redis session store run
+where no Redis server is available, in main_session_stores.py and
+bench_sessions.py; it is not part of the API:
+
+    server = FakeRedisServer().start()
+    store = RedisSessionStore(server.url)
+"""
+import fnmatch
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """
+    Serves the commands of one client connection
+    """
+
+    def handle(self):
+        """
+        Reads commands until the client disconnects
+        """
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            try:
+                reply = self.server.execute(args)
+            except Exception as e:
+                self.wfile.write(b"-ERR " + str(e).encode() + b"\r\n")
+            else:
+                self.wfile.write(encode(reply))
+
+    def read_command(self) -> Optional[List[bytes]]:
+        """
+        Reads a command sent as an array of bulk strings
+        """
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if line[:1] != b"*":
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+
+class Status(str):
+    """
+    Simple string reply
+    """
+
+
+def encode(reply: Any) -> bytes:
+    """
+    Encodes a reply
+    """
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Status):
+        return b"+" + reply.encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, (list, tuple, set)):
+        return b"*%d\r\n" % len(reply) + b"".join(map(encode, reply))
+    if isinstance(reply, str):
+        reply = reply.encode()
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    In-process Redis server keeping its keys in a dictionary
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Initializes the server on host and port, any free port if 0
+        """
+        super().__init__((host, port), FakeRedisHandler)
+        self.data: Dict[bytes, Tuple[Any, Optional[float]]] = {}
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        URL of the server
+        """
+        host, port = self.server_address[:2]
+        return "redis://{}:{}/0".format(host, port)
+
+    def start(self) -> "FakeRedisServer":
+        """
+        Serves in a background thread
+        """
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops serving and closes the socket
+        """
+        self.shutdown()
+        self.server_close()
+
+    def _value(self, key: bytes) -> Any:
+        """
+        Returns the value of a key, dropping it if expired
+        """
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args: List[bytes]) -> Any:
+        """
+        Runs a command
+        """
+        name = args[0].decode().upper()
+        command = getattr(self, "cmd_" + name.lower(), None)
+        if command is None:
+            raise ValueError("unknown command '{}'".format(name))
+        with self.lock:
+            return command(*args[1:])
+
+    def cmd_ping(self, *args):
+        """ PING [message] """
+        return args[0] if args else Status("PONG")
+
+    def cmd_select(self, db):
+        """ SELECT db, a single database is kept """
+        return Status("OK")
+
+    def cmd_get(self, key):
+        """ GET key """
+        return self._value(key)
+
+    def cmd_set(self, key, value, *options):
+        """ SET key value [EX seconds | PX milliseconds] """
+        expires_at = None
+        options = [option.upper() for option in options]
+        if b"EX" in options:
+            ttl = float(options[options.index(b"EX") + 1])
+            expires_at = time.monotonic() + ttl
+        elif b"PX" in options:
+            ttl = float(options[options.index(b"PX") + 1]) / 1000
+            expires_at = time.monotonic() + ttl
+        self.data[key] = (value, expires_at)
+        return Status("OK")
+
+    def cmd_del(self, *keys):
+        """ DEL key [key ...] """
+        count = 0
+        for key in keys:
+            if self._value(key) is not None:
+                del self.data[key]
+                count += 1
+        return count
+
+    def cmd_pexpire(self, key, milliseconds):
+        """ PEXPIRE key milliseconds """
+        value = self._value(key)
+        if value is None:
+            return 0
+        expires_at = time.monotonic() + float(milliseconds) / 1000
+        self.data[key] = (value, expires_at)
+        return 1
+
+    def cmd_persist(self, key):
+        """ PERSIST key """
+        value = self._value(key)
+        if value is None:
+            return 0
+        self.data[key] = (value, None)
+        return 1
+
+    def cmd_mget(self, *keys):
+        """ MGET key [key ...] """
+        return [self._value(key) for key in keys]
+
+    def cmd_zadd(self, key, *pairs):
+        """ ZADD key score member [score member ...] """
+        zset = self._value(key)
+        if zset is None:
+            zset = {}
+            self.data[key] = (zset, None)
+        count = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            count += member not in zset
+            zset[member] = float(score)
+        return count
+
+    def cmd_zrange(self, key, start, stop):
+        """ ZRANGE key start stop """
+        zset = self._value(key) or {}
+        members = sorted(zset, key=lambda member: (zset[member], member))
+        start, stop = int(start), int(stop)
+        if stop < 0:
+            stop += len(members)
+        return members[start:stop + 1]
+
+    def cmd_zrem(self, key, *members):
+        """ ZREM key member [member ...] """
+        zset = self._value(key)
+        if zset is None:
+            return 0
+        count = 0
+        for member in members:
+            count += zset.pop(member, None) is not None
+        if not zset:
+            del self.data[key]
+        return count
+
+    def cmd_exists(self, *keys):
+        """ EXISTS key [key ...] """
+        return sum(self._value(key) is not None for key in keys)
+
+    def cmd_scan(self, cursor, *options):
+        """ SCAN cursor [MATCH pattern] [COUNT count], in one pass """
+        names = [option.upper() for option in options]
+        pattern = b"*"
+        if b"MATCH" in names:
+            pattern = options[names.index(b"MATCH") + 1]
+        keys = [key for key in list(self.data)
+                if self._value(key) is not None and
+                fnmatch.fnmatchcase(key, pattern)]
+        return [b"0", keys]
+
+    def cmd_dbsize(self):
+        """ DBSIZE """
+        return sum(self._value(key) is not None for key in list(self.data))
+
+    def cmd_flushdb(self, *args):
+        """ FLUSHDB """
+        self.data.clear()
+        return Status("OK")
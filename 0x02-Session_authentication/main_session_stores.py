@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+""" Main session stores: checks every session store backend
+
+Usage: ./main_session_stores.py
+
+Runs get, set, touch, delete, delete_user and reap against the memory,
+sqlite, redis (on a FakeRedisServer) and db (UserSession) stores, in a
+temporary directory. Sessions are touched past the ttl they were created
+with, so that they must stay listed by user with sliding expiration.
+
+Then checks across worker processes that a touch written late by one
+worker does not bring back a session deleted by another one in the
+meantime (db store).
+
+Prints each check, and exits with status 1 at the first failure.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from api.v1.auth.session_store import (MemorySessionStore,
+                                       RedisSessionStore,
+                                       SQLiteSessionStore,
+                                       UserSessionStore)
+from fake_redis import FakeRedisServer
+
+
+def check(backend: str, name: str, ok: bool):
+    """ Print the result of a check, exit on a failure
+    """
+    print("{}: {}: {}".format(backend, name, "OK" if ok else "FAIL"))
+    if not ok:
+        sys.exit(1)
+
+
+def user_id_of(record) -> str:
+    """ Return the user ID of a record, a bare user ID or a dictionary
+    """
+    return record.get("user_id") if isinstance(record, dict) else record
+
+
+def check_store(backend: str, store):
+    """ Run the checks of one store
+    """
+    store.clear()
+    store.set("s1", "u1", 0, "u1")
+    store.set("s2", "u1", 1, "u1")
+    store.set("s3", "u1", 1, "u1")
+    check(backend, "get", user_id_of(store.get("s1")) == "u1")
+    check(backend, "get unknown", store.get("nope") is None)
+    check(backend, "user_sessions",
+          store.user_sessions("u1") == ["s1", "s2", "s3"])
+    check(backend, "touch unknown", not store.touch("nope", 3))
+    for _ in range(3):
+        time.sleep(0.4)
+        check(backend, "touch", store.touch("s2", 1))
+    store.reap()
+    check(backend, "expired", store.get("s3") is None)
+    check(backend, "touched", user_id_of(store.get("s2")) == "u1")
+    check(backend, "user_sessions after the first ttl",
+          store.user_sessions("u1") == ["s1", "s2"])
+    check(backend, "delete", store.delete("s1"))
+    check(backend, "delete again", not store.delete("s1"))
+    check(backend, "delete_user", store.delete_user("u1") == 1)
+    check(backend, "deleted by user", store.get("s2") is None)
+    check(backend, "user_sessions after delete_user",
+          store.user_sessions("u1") == [])
+    store.close()
+
+
+def worker(operation: str):
+    """ Run one operation on the db store, as a worker process
+    """
+    store = UserSessionStore()
+    if operation == "create":
+        store.set("s", "u", 60, "u")
+    elif operation == "touch":
+        print(store.touch("s", 120), flush=True)
+        # Until the write-behind flush
+        time.sleep(2 * store_write_behind())
+    elif operation == "delete":
+        store.delete("s")
+    else:
+        print(store.get("s"))
+    store.close()
+
+
+def store_write_behind() -> float:
+    """ Return the seconds writes of the workers are kept in memory
+    """
+    return float(os.environ["SESSION_DB_WRITE_BEHIND"])
+
+
+def check_no_resurrection():
+    """ A touch flushed after another worker deleted the session must
+    not bring the session back
+    """
+    env = dict(os.environ, SESSION_DB_WRITE_BEHIND="1")
+    command = [sys.executable, os.path.abspath(__file__), "worker"]
+    with tempfile.TemporaryDirectory() as tmp:
+        subprocess.run(command + ["create"], cwd=tmp, env=env, check=True)
+        toucher = subprocess.Popen(command + ["touch"], cwd=tmp, env=env,
+                                   stdout=subprocess.PIPE)
+        touched = toucher.stdout.readline().strip() == b"True"
+        subprocess.run(command + ["delete"], cwd=tmp, env=env, check=True)
+        toucher.wait()
+        toucher.stdout.close()
+        found = subprocess.run(command + ["get"], cwd=tmp, env=env,
+                               check=True, stdout=subprocess.PIPE).stdout
+    check("db", "touched before the delete", touched)
+    check("db", "late touch after delete", found.strip() == b"None")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "worker":
+        worker(sys.argv[2])
+        sys.exit(0)
+    server = FakeRedisServer().start()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        check_store("memory", MemorySessionStore())
+        check_store("sqlite", SQLiteSessionStore(
+            os.path.join(tmp, "sessions.sqlite3")))
+        check_store("redis", RedisSessionStore(server.url))
+        check_store("db", UserSessionStore())
+    server.stop()
+    check_no_resurrection()
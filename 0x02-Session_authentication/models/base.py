@@ -2,38 +2,264 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Optional, Tuple
+from models.log_store import LogStore
+import atexit
+import bisect
 import json
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+STORES = {}
+
+
+@atexit.register
+def close_stores():
+    """ fsync and close every log store
+    """
+    for store in STORES.values():
+        store.close()
+
+
+def index_add(index: dict, value, obj_id: str):
+    """ Add obj_id to index under value
+    """
+    try:
+        index.setdefault(value, {})[obj_id] = None
+    except TypeError:
+        # Unhashable value: only reachable through a scan
+        pass
+
+
+def index_discard(index: dict, value, obj_id: str):
+    """ Remove obj_id from index under value
+    """
+    try:
+        ids = index.get(value)
+    except TypeError:
+        return
+    if ids is not None:
+        ids.pop(obj_id, None)
+        if not ids:
+            del index[value]
+
+
+class Objects(dict):
+    """ Objects of a class by ID
+
+    Values loaded from file are kept as their JSON dictionary and only
+    turned into objects when first read.
+
+    version is bumped on every change to a saved object, json_cache
+    holds the encoded list of all objects with the version it encodes.
+    IDs are also kept sorted, the stable order used to page through the
+    objects.
+    """
+
+    def __init__(self, cls: type, objs_json: dict = None):
+        """ Initialize with the JSON dictionaries of objects of cls
+        """
+        super().__init__(objs_json or {})
+        self._cls = cls
+        self.version = 0
+        self.json_cache = None
+        self._ids = None
+
+    def sorted_ids(self) -> List[str]:
+        """ Return the IDs in ascending order
+        """
+        if self._ids is None:
+            self._ids = sorted(dict.keys(self))
+        return self._ids
+
+    def __setitem__(self, obj_id: str, obj):
+        """ Store an object by ID
+        """
+        if self._ids is not None and not dict.__contains__(self, obj_id):
+            bisect.insort(self._ids, obj_id)
+        dict.__setitem__(self, obj_id, obj)
+
+    def __delitem__(self, obj_id: str):
+        """ Delete an object by ID
+        """
+        dict.__delitem__(self, obj_id)
+        if self._ids is not None:
+            del self._ids[bisect.bisect_left(self._ids, obj_id)]
+
+    def page(self, after: str = None, limit: int = 100) -> list:
+        """ Return up to limit objects following ID after in ID order
+        """
+        ids = self.sorted_ids()
+        start = 0 if after is None else bisect.bisect_right(ids, after)
+        return [self[obj_id] for obj_id in ids[start:start + limit]]
+
+    def _hydrate(self, obj_id: str, value):
+        """ Return the object for value, building it from JSON if needed
+        """
+        if type(value) is dict:
+            value = self._cls(**value)
+            dict.__setitem__(self, obj_id, value)
+        return value
+
+    def __getitem__(self, obj_id: str):
+        """ Return an object by ID
+        """
+        return self._hydrate(obj_id, dict.__getitem__(self, obj_id))
+
+    def get(self, obj_id: str, default=None):
+        """ Return an object by ID, or default
+        """
+        value = dict.get(self, obj_id)
+        if value is None:
+            return default
+        return self._hydrate(obj_id, value)
+
+    def values(self) -> list:
+        """ Return all objects
+        """
+        return [self._hydrate(obj_id, value)
+                for obj_id, value in list(dict.items(self))]
+
+    def items(self) -> list:
+        """ Return all (ID, object) pairs
+        """
+        return [(obj_id, self._hydrate(obj_id, value))
+                for obj_id, value in list(dict.items(self))]
+
+
+class Timestamp():
+    """ datetime attribute parsed from its JSON string when first read
+
+    The value is kept in the slot of the same name prefixed by '_'.
+    """
+
+    def __set_name__(self, owner: type, name: str):
+        """ Remember the slot holding the value
+        """
+        self.slot = "_" + name
+
+    def __get__(self, obj, owner: type = None):
+        """ Return the datetime, parsing it if still a string
+        """
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if type(value) is str:
+            value = datetime.strptime(value, TIMESTAMP_FORMAT)
+            object.__setattr__(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        """ Set a datetime, or a string in TIMESTAMP_FORMAT
+        """
+        object.__setattr__(obj, self.slot, value)
 
 
 class Base():
     """ Base class
+
+    Attributes live in __slots__ rather than a per-instance __dict__.
+    Subclasses list theirs in __slots__ too, which adds them to the
+    (JSON key, attribute) pairs of _fields serialized by to_json.
+
+    Subclasses declare the attributes to index in _indexes, and the ones
+    whose values must not be shared by two saved objects in _unique:
+    setting a saved object to a value in use raises ValueError, leaving
+    it unchanged.
     """
 
+    __slots__ = ('id', '_created_at', '_updated_at')
+
+    _fields: Tuple[Tuple[str, str], ...] = (
+        ('id', 'id'),
+        ('created_at', '_created_at'),
+        ('updated_at', '_updated_at'),
+    )
+    _indexes: Tuple[str, ...] = ()
+    _unique: Tuple[str, ...] = ()
+
+    created_at = Timestamp()
+    updated_at = Timestamp()
+
+    def __init_subclass__(cls, **kwargs):
+        """ Add the slots of a subclass to its serialized fields
+        """
+        super().__init_subclass__(**kwargs)
+        slots = cls.__dict__.get('__slots__', ())
+        cls._fields = cls._fields + tuple((name, name) for name in slots)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            DATA[s_class] = Objects(self.__class__)
+            self.__class__._reindex()
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
-            self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+        self.id = kwargs['id'] if 'id' in kwargs else str(uuid.uuid4())
+        self.created_at = kwargs.get('created_at') or datetime.utcnow()
+        self.updated_at = kwargs.get('updated_at') or datetime.utcnow()
+
+    def __setattr__(self, name: str, value):
+        """ Set an attribute, keeping the indexes of saved objects current
+        and the version of their class
+        """
+        saved = self._is_saved()
+        if saved and name in self._unique:
+            # Refused before the object and its indexes change
+            self._check_unique_value(name, value)
+        if saved and name in self._indexes:
+            index = INDEXES[self.__class__.__name__][name]
+            index_discard(index, getattr(self, name, None), self.id)
+            object.__setattr__(self, name, value)
+            index_add(index, value, self.id)
         else:
-            self.updated_at = datetime.utcnow()
+            object.__setattr__(self, name, value)
+        if saved:
+            DATA[self.__class__.__name__].version += 1
+
+    def _is_saved(self) -> bool:
+        """ Tell whether this very object is in DATA
+        """
+        objs = DATA.get(self.__class__.__name__)
+        return objs is not None and \
+            dict.get(objs, getattr(self, "id", None)) is self
+
+    def _check_unique_value(self, name: str, value):
+        """ Raise a ValueError if value of the unique attribute name is
+        used by another object
+        """
+        if value is None:
+            return
+        try:
+            ids = INDEXES[self.__class__.__name__][name].get(value, {})
+        except TypeError:
+            return
+        if any(obj_id != self.id for obj_id in ids):
+            raise ValueError("{} {} already exists".format(name, value))
+
+    def _check_unique(self):
+        """ Raise a ValueError if a unique value is used by another object
+        """
+        for name in self._unique:
+            self._check_unique_value(name, getattr(self, name, None))
+
+    @classmethod
+    def _reindex(cls):
+        """ Rebuild the indexes of the class from DATA
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {name: {} for name in cls._indexes}
+        for obj_id, obj in dict.items(DATA[s_class]):
+            for name, index in INDEXES[s_class].items():
+                if type(obj) is dict:
+                    value = obj.get(name)
+                else:
+                    value = getattr(obj, name, None)
+                index_add(index, value, obj_id)
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
@@ -47,8 +273,11 @@ class Base():
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
+        items = [(key, getattr(self, attr, None))
+                 for key, attr in self._fields]
+        items.extend(getattr(self, '__dict__', {}).items())
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,49 +286,155 @@ class Base():
                 result[key] = value
         return result
 
+    @classmethod
+    def all_json(cls) -> bytes:
+        """ Return the encoded JSON list of all objects
+
+        The encoding is kept until an object of the class changes.
+        """
+        objs = DATA[cls.__name__]
+        version = objs.version
+        if objs.json_cache is None or objs.json_cache[0] != version:
+            encoded = json.dumps([obj.to_json() for obj in objs.values()])
+            objs.json_cache = (version, encoded.encode())
+        return objs.json_cache[1]
+
+    @classmethod
+    def store(cls) -> LogStore:
+        """ Return the log store of the class
+        """
+        s_class = cls.__name__
+        if STORES.get(s_class) is None:
+            STORES[s_class] = LogStore(s_class)
+        return STORES[s_class]
+
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
+
+        Objects are built when first used, see Objects.
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        DATA[s_class] = Objects(cls, cls.store().load())
+        cls._reindex()
+
+    @classmethod
+    def refresh_from_file(cls) -> Optional[List[dict]]:
+        """ Apply the writes made to file by other processes since the
+        last load or refresh, return their records
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        Return None if every object was loaded again instead.
+        """
+        s_class = cls.__name__
+        records = cls.store().read_new()
+        if records is None or DATA.get(s_class) is None:
+            cls.load_from_file()
+            return None
+        objs = DATA[s_class]
+        indexes = INDEXES[s_class]
+        for record in records:
+            obj_id = record["obj"]["id"] if record.get("op") == "save" \
+                else record.get("id")
+            previous = dict.get(objs, obj_id)
+            if record.get("op") == "update":
+                if previous is None:
+                    continue
+                obj_json = previous if type(previous) is dict \
+                    else previous.to_json(True)
+                record = {"op": "save",
+                          "obj": dict(obj_json, **record["fields"])}
+            if previous is not None:
+                for name, index in indexes.items():
+                    if type(previous) is dict:
+                        value = previous.get(name)
+                    else:
+                        value = getattr(previous, name, None)
+                    index_discard(index, value, obj_id)
+            if record.get("op") == "save":
+                objs[obj_id] = record["obj"]
+                for name, index in indexes.items():
+                    index_add(index, record["obj"].get(name), obj_id)
+            elif previous is not None:
+                del objs[obj_id]
+            objs.version += 1
+        return records
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
         objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        for obj_id, obj in dict.items(DATA[s_class]):
+            if type(obj) is dict:
+                objs_json[obj_id] = obj
+            else:
+                objs_json[obj_id] = obj.to_json(True)
+        cls.store().write_snapshot(objs_json)
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
+        self._check_unique()
         self.updated_at = datetime.utcnow()
+        previous = DATA[s_class].get(self.id)
+        for name, index in INDEXES[s_class].items():
+            if previous is not None:
+                index_discard(index, getattr(previous, name, None), self.id)
+            index_add(index, getattr(self, name, None), self.id)
         DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        DATA[s_class].version += 1
+        self.__class__.store().append_save(self.to_json(True))
+
+    def save_fields(self, *names: str):
+        """ Save the given attributes of a saved object only
+
+        The write is logged as an update, which is dropped if the object
+        has been removed meanwhile, even by another process, where a
+        save() would bring it back.
+        """
+        if not self._is_saved():
+            self.save()
+            return
+        self.updated_at = datetime.utcnow()
+        obj_json = self.to_json(True)
+        fields = {name: obj_json[name] for name in names + ('updated_at',)}
+        self.__class__.store().append_update(self.id, fields)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
+        obj = DATA[s_class].get(self.id)
+        if obj is not None:
+            for name, index in INDEXES[s_class].items():
+                index_discard(index, getattr(obj, name, None), self.id)
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            DATA[s_class].version += 1
+            self.__class__.store().append_remove(self.id)
+
+    @classmethod
+    def save_many(cls, objs: Iterable[TypeVar('Base')]):
+        """ Save several objects with a single durable write
+        """
+        with cls.batch():
+            for obj in objs:
+                obj.save()
+
+    @classmethod
+    def batch(cls) -> Iterator[LogStore]:
+        """ Context manager coalescing the save() and remove() calls of
+        the block into a single durable write when it exits
+        """
+        return cls.store().batch()
+
+    @classmethod
+    def flush(cls):
+        """ Durably write the pending writes of the class, for callers
+        that need it in write-behind mode
+        """
+        cls.store().flush()
 
     @classmethod
     def count(cls) -> int:
@@ -114,6 +449,14 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def page(cls, after: str = None,
+             limit: int = 100) -> List[TypeVar('Base')]:
+        """ Return up to limit objects ordered by ID, starting after the
+        ID after
+        """
+        return DATA[cls.__name__].page(after, limit)
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
@@ -124,8 +467,25 @@ class Base():
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Equality on an indexed attribute is answered from its index, the
+        other attributes are then checked on the matching objects only.
         """
         s_class = cls.__name__
+        objs = None
+        indexes = INDEXES.get(s_class, {})
+        for k, v in attributes.items():
+            if k not in indexes:
+                continue
+            try:
+                ids = indexes[k].get(v, {})
+            except TypeError:
+                continue
+            objs = [DATA[s_class][obj_id] for obj_id in ids]
+            break
+        if objs is None:
+            objs = DATA[s_class].values()
+
         def _search(obj):
             if len(attributes) == 0:
                 return True
@@ -133,5 +493,5 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        return list(filter(_search, objs))
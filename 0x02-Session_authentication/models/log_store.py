@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+""" Log store module
+"""
+from contextlib import contextmanager
+from os import getenv, path
+from typing import Dict, List, Optional, Tuple
+import fcntl
+import json
+import os
+import threading
+import time
+
+
+FSYNC_BATCH = int(getenv("STORE_FSYNC_BATCH", "64"))
+FSYNC_INTERVAL = float(getenv("STORE_FSYNC_INTERVAL", "1.0"))
+COMPACT_THRESHOLD = int(getenv("STORE_COMPACT_THRESHOLD", "10000"))
+# Seconds between two flushes in write-behind mode, 0 to disable it
+WRITE_BEHIND = float(getenv("STORE_WRITE_BEHIND", "0"))
+# JSON codec: "orjson" when installed, or the standard "json" module
+CODEC = getenv("STORE_CODEC", "orjson")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if CODEC == "orjson" and orjson is not None:
+    def dumps(obj) -> str:
+        """ Serialize obj to a JSON string with orjson
+        """
+        return orjson.dumps(obj).decode()
+
+    loads = orjson.loads
+else:
+    dumps = json.dumps
+    loads = json.loads
+
+
+def fsync_dir(dir_path: str):
+    """ fsync a directory so that renames in it survive a crash
+    """
+    fd = os.open(dir_path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class LogStore():
+    """ Append-only storage of one class of objects
+
+    The state of the class is a JSON snapshot (.db_<Class>.json) plus a
+    log of the writes made since (.db_<Class>.log), one JSON record per
+    line. A write only appends the changed object, or its changed fields
+    for an update, whatever the number of objects. The log is folded back
+    into the snapshot in the background once it holds COMPACT_THRESHOLD
+    records.
+
+    Inside batch(), or at all times in write-behind mode, records are
+    kept in memory and written with a single write and fsync by flush().
+    Only the last record of each object is kept until then.
+
+    Several processes can share a store: writes hold an flock on
+    .db_<Class>.lock, which also holds a generation counter bumped each
+    time the log is rotated, so every process appends to the current
+    log. Snapshots are written to a temporary file, fsync'ed and renamed
+    into place, and a record cut short by a crash is dropped before the
+    next append.
+    """
+
+    def __init__(self, s_class: str):
+        """ Initialize the store of the class named s_class
+        """
+        self.snapshot_path = ".db_{}.json".format(s_class)
+        self.log_path = ".db_{}.log".format(s_class)
+        self.old_log_path = self.log_path + ".1"
+        self.lock_path = ".db_{}.lock".format(s_class)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_depth = 0
+        self._file = None
+        self._generation = None
+        self._records = 0
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._pending = {}
+        self._batch_depth = 0
+        self._flusher = None
+        self._syncer = None
+        self._read_position = None
+        self.write_behind = WRITE_BEHIND
+
+    @contextmanager
+    def _flock(self, operation: int = fcntl.LOCK_EX):
+        """ Hold the thread lock and the inter-process file lock
+        """
+        with self._lock:
+            if self._lock_fd is None:
+                self._lock_fd = os.open(self.lock_path,
+                                        os.O_RDWR | os.O_CREAT, 0o644)
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_fd, operation)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def generation(self) -> int:
+        """ Return the generation of the log, under the file lock
+        """
+        data = os.pread(self._lock_fd, 32, 0)
+        return int(data) if data.strip() else 0
+
+    def _bump_generation(self):
+        """ Start a new generation of the log, under the file lock
+        """
+        data = str(self.generation() + 1).encode()
+        os.ftruncate(self._lock_fd, 0)
+        os.pwrite(self._lock_fd, data, 0)
+        os.fsync(self._lock_fd)
+
+    def _log(self):
+        """ Return the log file of the current generation, opened for
+        appending, under the file lock
+
+        A record left incomplete by a process that crashed while
+        appending is cut first, even when the log was already open, so
+        that the next record does not land on the same line.
+        """
+        generation = self.generation()
+        if self._file is not None and self._generation != generation:
+            self.close()
+        if self._file is None:
+            self._file = open(self.log_path, 'a+')
+            self._generation = generation
+        self._repair(self._file.fileno())
+        return self._file
+
+    @staticmethod
+    def _repair(fd: int):
+        """ Cut a last record left incomplete by a crash
+        """
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return
+        if os.pread(fd, 1, size - 1) == b"\n":
+            return
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            newline = os.pread(fd, end - start, start).rfind(b"\n")
+            if newline != -1:
+                os.ftruncate(fd, start + newline + 1)
+                return
+            end = start
+        os.ftruncate(fd, 0)
+
+    def _write(self, lines: str, count: int, durable: bool = False):
+        """ Write count records to the log
+
+        The records reach the OS right away and are fsync'ed with the next
+        FSYNC_BATCH records or at most FSYNC_INTERVAL seconds later, by a
+        background thread if no other write comes, or now if durable is
+        set.
+        """
+        with self._flock():
+            f = self._log()
+            f.write(lines)
+            f.flush()
+            self._records += count
+            self._unsynced += count
+            if (durable or self._unsynced >= FSYNC_BATCH or
+                    time.monotonic() - self._synced_at >= FSYNC_INTERVAL):
+                self.sync()
+            elif self._syncer is None:
+                self._syncer = threading.Thread(target=self._sync_loop,
+                                                daemon=True)
+                self._syncer.start()
+            compact = self._records >= COMPACT_THRESHOLD
+        if compact and not self._compact_lock.locked():
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def append(self, obj_id: str, record: dict):
+        """ Append the record of a write to object obj_id
+        """
+        with self._lock:
+            if self._batch_depth == 0 and not self.write_behind:
+                self._write(dumps(record) + "\n", 1)
+                return
+            self._pending.pop(obj_id, None)
+            self._pending[obj_id] = record
+            if self.write_behind and self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop,
+                                                 daemon=True)
+                self._flusher.start()
+
+    def flush(self, durable: bool = True):
+        """ Write the records kept in memory, durably unless durable is
+        unset, in which case they are fsync'ed like other appends
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            records = list(self._pending.values())
+            self._pending = {}
+            lines = "".join(dumps(record) + "\n" for record in records)
+            self._write(lines, len(records), durable=durable)
+
+    def _sync_loop(self):
+        """ fsync the records left unsynced by an idle store, every
+        FSYNC_INTERVAL seconds until there are none
+        """
+        while True:
+            time.sleep(FSYNC_INTERVAL)
+            with self._lock:
+                if self._unsynced == 0:
+                    self._syncer = None
+                    return
+                if time.monotonic() - self._synced_at >= FSYNC_INTERVAL:
+                    self.sync()
+
+    def _flush_loop(self):
+        """ Flush every write_behind seconds, in write-behind mode
+        """
+        while self.write_behind:
+            time.sleep(self.write_behind)
+            self.flush()
+        with self._lock:
+            self._flusher = None
+
+    @contextmanager
+    def batch(self):
+        """ Coalesce the writes made in the block into one flush
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
+
+    def append_save(self, obj_json: dict):
+        """ Log that an object has been saved
+        """
+        self.append(obj_json["id"], {"op": "save", "obj": obj_json,
+                                     "pid": os.getpid()})
+
+    def append_remove(self, obj_id: str):
+        """ Log that an object has been removed
+        """
+        self.append(obj_id, {"op": "remove", "id": obj_id,
+                             "pid": os.getpid()})
+
+    def append_update(self, obj_id: str, fields: dict):
+        """ Log that some fields of an object have changed
+
+        Unlike a save, an update applies to an object that still exists
+        only, so that a late update cannot bring back an object removed
+        in the meantime, by this process or another one.
+        """
+        record = {"op": "update", "id": obj_id, "fields": fields,
+                  "pid": os.getpid()}
+        with self._lock:
+            pending = self._pending.get(obj_id)
+            if pending is not None:
+                if pending["op"] == "remove":
+                    return
+                if pending["op"] == "save":
+                    record = dict(pending, obj=dict(pending["obj"], **fields))
+                else:
+                    record = dict(pending,
+                                  fields=dict(pending["fields"], **fields))
+            self.append(obj_id, record)
+
+    def sync(self):
+        """ fsync the records appended so far
+        """
+        with self._lock:
+            if self._file is not None and self._unsynced > 0:
+                os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._synced_at = time.monotonic()
+
+    def close(self):
+        """ fsync and close the log
+        """
+        with self._lock:
+            self.flush()
+            self.sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def _read_records(log_path: str,
+                      offset: int = 0) -> Tuple[List[dict], int]:
+        """ Return the records of a log file from offset on, and the offset
+        following the last complete record
+        """
+        records = []
+        if not path.exists(log_path):
+            return records, 0
+        with open(log_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Record being written, or cut short by a crash
+                    break
+                offset += len(line)
+                try:
+                    records.append(loads(line))
+                except ValueError:
+                    continue
+        return records, offset
+
+    @staticmethod
+    def apply(records: List[dict], objs_json: Dict[str, dict]):
+        """ Apply records to objs_json
+        """
+        for record in records:
+            if record.get("op") == "save":
+                obj_json = record["obj"]
+                objs_json[obj_json["id"]] = obj_json
+            elif record.get("op") == "remove":
+                objs_json.pop(record["id"], None)
+            elif record.get("op") == "update":
+                obj_json = objs_json.get(record["id"])
+                if obj_json is not None:
+                    objs_json[record["id"]] = dict(obj_json,
+                                                   **record["fields"])
+
+    def load(self) -> Dict[str, dict]:
+        """ Return the JSON dictionary of every stored object by ID
+        """
+        self.flush()
+        with self._flock(fcntl.LOCK_SH):
+            objs_json = self._read_snapshot()
+            self.apply(self._read_records(self.old_log_path)[0], objs_json)
+            records, offset = self._read_records(self.log_path)
+            self.apply(records, objs_json)
+            self._read_position = (self.generation(), offset)
+            return objs_json
+
+    def read_new(self) -> Optional[List[dict]]:
+        """ Return the records appended to the log by other processes
+        since the last load() or read_new()
+
+        Return None if the log was rotated since, in which case the
+        objects must be loaded again.
+        """
+        with self._flock(fcntl.LOCK_SH):
+            if self._read_position is None or \
+                    self._read_position[0] != self.generation():
+                return None
+            offset = self._read_position[1]
+            if path.exists(self.log_path) and \
+                    path.getsize(self.log_path) < offset:
+                # Log cut short by a repair
+                return None
+            records, offset = self._read_records(self.log_path, offset)
+            self._read_position = (self._read_position[0], offset)
+            pid = os.getpid()
+            return [record for record in records
+                    if record.get("pid") != pid]
+
+    def _read_snapshot(self) -> Dict[str, dict]:
+        """ Return the content of the snapshot file
+        """
+        if not path.exists(self.snapshot_path):
+            return {}
+        with open(self.snapshot_path, 'r') as f:
+            return loads(f.read())
+
+    def _write_snapshot(self, objs_json: Dict[str, dict]):
+        """ Atomically replace the snapshot file by objs_json
+        """
+        tmp_path = "{}.{}.tmp".format(self.snapshot_path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(dumps(objs_json))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+        finally:
+            if path.exists(tmp_path):
+                os.remove(tmp_path)
+        fsync_dir(path.dirname(self.snapshot_path))
+
+    @contextmanager
+    def _compaction(self, blocking: bool = True):
+        """ Hold the lock taken by compactions and full snapshots, yield
+        whether it was acquired
+        """
+        with self._compact_lock:
+            fd = os.open(self.lock_path + ".compact",
+                         os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX |
+                                (0 if blocking else fcntl.LOCK_NB))
+                except OSError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+    def write_snapshot(self, objs_json: Dict[str, dict]):
+        """ Store objs_json as the full state and empty the log
+        """
+        with self._compaction(), self._flock():
+            self._pending = {}
+            self.close()
+            self._write_snapshot(objs_json)
+            for log_path in (self.old_log_path, self.log_path):
+                if path.exists(log_path):
+                    os.remove(log_path)
+            self._bump_generation()
+            self._records = 0
+
+    def compact(self):
+        """ Fold the log into the snapshot
+
+        The current log is set aside and a new one is started, so writes
+        go on while the old log and the snapshot are merged. Only one
+        process compacts at a time, the others skip.
+        """
+        with self._compaction(blocking=False) as acquired:
+            if not acquired:
+                return
+            with self._flock():
+                self.close()
+                if not path.exists(self.old_log_path) and \
+                        path.exists(self.log_path):
+                    os.replace(self.log_path, self.old_log_path)
+                    self._bump_generation()
+                self._records = 0
+            objs_json = self._read_snapshot()
+            self.apply(self._read_records(self.old_log_path)[0], objs_json)
+            with self._flock():
+                self._write_snapshot(objs_json)
+                if path.exists(self.old_log_path):
+                    os.remove(self.old_log_path)
@@ -1,19 +1,25 @@
 #!/usr/bin/env python3
-
-from sqlalchemy import Column, String
+""" UserSession module
+"""
 from models.base import Base
 
 
 class UserSession(Base):
-    """UserSession model to store user session IDs"""
+    """ UserSession class, a session ID of a user stored on disk
+
+    expires_at is the UNIX time the session expires at, None if it does
+    not expire.
+    """
 
-    __tablename__ = 'user_sessions'
+    __slots__ = ('user_id', 'session_id', 'expires_at')
 
-    user_id = Column(String(60), nullable=False)
-    session_id = Column(String(60), primary_key=True, nullable=False)
+    _indexes = ("session_id", "user_id")
+    _unique = ("session_id",)
 
     def __init__(self, *args: list, **kwargs: dict):
-        """Initialize UserSession instance"""
+        """ Initialize a UserSession instance
+        """
         super().__init__(*args, **kwargs)
-        self.user_id = kwargs.get('user_id', '')
-        self.session_id = kwargs.get('session_id', '')
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
+        self.expires_at = kwargs.get('expires_at')
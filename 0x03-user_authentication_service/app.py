@@ -4,6 +4,7 @@ Basic Flask app
 """
 from flask import Flask, jsonify, request
 from auth import Auth
+from hasher import HasherBusy
 import logging
 
 app = Flask(__name__)
@@ -15,6 +16,15 @@ AUTH = Auth()
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
 
 
+@app.teardown_appcontext
+def remove_db_session(exception=None) -> None:
+    """
+    Close the database session of the request, returning its connection
+    to the pool
+    """
+    AUTH._db.remove_session()
+
+
 @app.route("/", methods=["GET"])
 def index() -> Flask.response_class:
     """
@@ -39,6 +49,8 @@ def users() -> Flask.response_class:
         return jsonify({"email": email, "message": "user created"})
     except ValueError:
         return jsonify({"message": "email already registered"}), 400
+    except HasherBusy:
+        return jsonify({"message": "server busy, retry later"}), 503
 
 
 if __name__ == "__main__":
@@ -2,29 +2,54 @@
 """
 Auth module
 """
+import os
 import bcrypt
 import uuid
 from db import DB
+from hasher import HASHER
 from user import User
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 from typing import Optional
 
+# bcrypt work factor used for new hashes
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 
 def _hash_password(password: str) -> bytes:
     """
-    Hash a password with bcrypt.
+    Hash a password with bcrypt on the hashing pool.
 
     Args:
         password (str): The password to hash.
 
     Returns:
         bytes: The hashed password.
+
+    Raises:
+        HasherBusy: If the hashing queue is full.
     """
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode(), salt)
+    salt = bcrypt.gensalt(BCRYPT_ROUNDS)
+    hashed = HASHER.hashpw(password.encode(), salt)
     return hashed
 
 
+def _needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Check whether a hash was made with a cost other than BCRYPT_ROUNDS.
+
+    Args:
+        hashed_password (bytes): A bcrypt hash such as b'$2b$12$...'.
+
+    Returns:
+        bool: True if the hash should be replaced.
+    """
+    try:
+        return int(hashed_password.split(b'$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
 def _generate_uuid() -> str:
     """
     Generate a new UUID.
@@ -60,13 +85,20 @@ class Auth:
             raise ValueError(f"User {email} already exists")
         except NoResultFound:
             hashed_password = _hash_password(password)
-            new_user = self._db.add_user(email, hashed_password)
+            try:
+                new_user = self._db.add_user(email, hashed_password)
+            except IntegrityError:
+                # Registered by a concurrent request since the lookup
+                raise ValueError(f"User {email} already exists")
             return new_user
 
     def valid_login(self, email: str, password: str) -> bool:
         """
         Validate login credentials.
 
+        A hash made with a cost other than BCRYPT_ROUNDS is replaced by a
+        new one once the password has been checked.
+
         Args:
             email (str): The user's email.
             password (str): The user's password.
@@ -76,8 +108,12 @@ class Auth:
         """
         try:
             user = self._db.find_user_by(email=email)
-            if (user and bcrypt.checkpw(password.encode(),
+            if (user and HASHER.checkpw(password.encode(),
                                         user.hashed_password)):
+                if _needs_rehash(user.hashed_password):
+                    self._db.update_user(
+                        user.id, hashed_password=_hash_password(password)
+                    )
                 return True
             return False
         except NoResultFound:
@@ -93,13 +129,11 @@ class Auth:
         Returns:
             str: The session ID, or None if user not found.
         """
-        try:
-            user = self._db.find_user_by(email=email)
-            session_id = _generate_uuid()
-            self._db.update_user(user.id, session_id=session_id)
-            return session_id
-        except NoResultFound:
+        session_id = _generate_uuid()
+        if self._db.update_users_by({"session_id": session_id},
+                                    email=email) == 0:
             return None
+        return session_id
 
     def get_user_from_session_id(self, session_id: str) -> Optional[User]:
         """
@@ -141,13 +175,11 @@ class Auth:
         Raises:
             ValueError: If no user found with the given email.
         """
-        try:
-            user = self._db.find_user_by(email=email)
-            reset_token = _generate_uuid()
-            self._db.update_user(user.id, reset_token=reset_token)
-            return reset_token
-        except NoResultFound:
+        reset_token = _generate_uuid()
+        if self._db.update_users_by({"reset_token": reset_token},
+                                    email=email) == 0:
             raise ValueError(f"No user found with email {email}")
+        return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
         """
@@ -160,13 +192,18 @@ class Auth:
         Raises:
             ValueError: If the reset token is invalid.
         """
+        if reset_token is None:
+            # Would match every user without a pending reset
+            raise ValueError("Invalid reset token")
         try:
-            user = self._db.find_user_by(reset_token=reset_token)
-            hashed_pwd = _hash_password(password)
-            self._db.update_user(
-                user.id,
-                hashed_password=hashed_pwd,
-                reset_token=None
-            )
+            self._db.find_user_by(reset_token=reset_token)
         except NoResultFound:
             raise ValueError("Invalid reset token")
+        hashed_pwd = _hash_password(password)
+        # Matching the token again spends it once only, even when two
+        # requests race with it
+        if self._db.update_users_by(
+            {"hashed_password": hashed_pwd, "reset_token": None},
+            reset_token=reset_token
+        ) == 0:
+            raise ValueError("Invalid reset token")
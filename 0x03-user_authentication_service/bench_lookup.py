@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Lookup benchmark: find_user_by latency with and without the indexes.
+
+Usage: ./bench_lookup.py [users ...]
+
+For each size, fills a SQLite database in a temporary directory, then
+times find_user_by on email, session_id and reset_token with the
+indexes of the User model and with them dropped, as before. Without the
+indexes each lookup scans the table, so fewer lookups are timed.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from db import DB
+from user import User
+
+INSERT_CHUNK = 100000
+COLUMNS = ("email", "session_id", "reset_token")
+
+
+def fill(db: DB, count: int) -> None:
+    """
+    Insert count users, every one with a session ID and a reset token.
+
+    Args:
+        db (DB): The database.
+        count (int): The number of users.
+    """
+    table = User.__table__
+    with db._engine.begin() as connection:
+        for start in range(0, count, INSERT_CHUNK):
+            connection.execute(table.insert(), [{
+                "email": "user{}@hbtn.io".format(i),
+                "hashed_password": "$2b$12$" + "x" * 53,
+                "session_id": "session-{}".format(i),
+                "reset_token": "reset-{}".format(i),
+            } for i in range(start, min(count, start + INSERT_CHUNK))])
+
+
+def lookup_ms(db: DB, count: int, lookups: int) -> Dict[str, float]:
+    """
+    Time random lookups on each column.
+
+    Args:
+        db (DB): The database.
+        count (int): The number of users.
+        lookups (int): The number of lookups per column.
+
+    Returns:
+        Dict[str, float]: The mean milliseconds of a lookup by column.
+    """
+    values = {
+        "email": "user{}@hbtn.io",
+        "session_id": "session-{}",
+        "reset_token": "reset-{}",
+    }
+    result = {}
+    for column in COLUMNS:
+        keys: List[str] = [values[column].format(random.randrange(count))
+                           for _ in range(lookups)]
+        start = time.perf_counter()
+        for key in keys:
+            db.find_user_by(**{column: key})
+            db.remove_session()
+        result[column] = (time.perf_counter() - start) / lookups * 1000
+    return result
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 1000000,
+                                                   10000000]
+    print("{:>9} {:>12} {:>12} {:>12}  (ms per lookup)".format(
+        "users", *COLUMNS))
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = "sqlite:///" + os.path.join(tmp, "bench.db")
+            db = DB(url, production=True)
+            fill(db, count)
+            indexed = lookup_ms(db, count, 1000)
+            with db._engine.begin() as connection:
+                for index in User.__table__.indexes:
+                    index.drop(bind=connection)
+            scanned = lookup_ms(db, count, max(3, 10000000 // count // 10))
+            db._engine.dispose()
+        for label, result in (("indexed", indexed), ("scan", scanned)):
+            print("{:>9} {:>12.3f} {:>12.3f} {:>12.3f}  {}".format(
+                count, *(result[column] for column in COLUMNS), label))
@@ -1,37 +1,164 @@
 #!/usr/bin/env python3
 """DB module"""
-from sqlalchemy import create_engine
+import os
+from typing import Any, Dict, List
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import (InvalidRequestError, OperationalError,
+                            ProgrammingError)
+from sqlalchemy.pool import QueuePool
 
 from user import Base, User
 
+# Database URL, and "production" to keep the data across restarts and use
+# a connection pool, or anything else to start from an empty database
+DB_URL = os.getenv("DB_URL", "sqlite:///a.db")
+DB_MODE = os.getenv("DB_MODE", "development")
+# Connection pool of the production mode
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in (
+    "1", "true")
+
+# Columns update_user and update_users_by may set, checked once here
+# rather than on a loaded User
+USER_COLUMNS = frozenset(User.__table__.columns.keys())
+
+
+def create_schema(engine: Engine) -> None:
+    """
+    Create the missing tables of the models.
+
+    Every worker of a server runs this at startup, so a table created by
+    another worker in the meantime is not an error.
+
+    Args:
+        engine (Engine): The engine of the database.
+    """
+    try:
+        Base.metadata.create_all(engine)
+    except (OperationalError, ProgrammingError):
+        tables = inspect(engine).get_table_names()
+        if any(table.name not in tables
+               for table in Base.metadata.sorted_tables):
+            raise
+
+
+def migrate(engine: Engine) -> List[str]:
+    """
+    Create the indexes of the models missing from an existing database.
+
+    create_all() only creates the indexes of the tables it creates, so
+    the indexes added to a model later are created here. Every worker of
+    a server runs this at startup, so an index created by another worker
+    in the meantime is skipped.
+
+    Args:
+        engine (Engine): The engine of the database.
+
+    Returns:
+        List[str]: The names of the indexes created.
+
+    Raises:
+        IntegrityError: If the rows break a new unique index. The index
+        is not created, and startup fails until the duplicate rows are
+        removed.
+    """
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {index["name"] for index in
+                    inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=engine)
+            except (OperationalError, ProgrammingError):
+                names = {found["name"] for found in
+                         inspect(engine).get_indexes(table.name)}
+                if index.name not in names:
+                    raise
+                continue
+            created.append(index.name)
+    return created
+
 
 class DB:
-    """DB class"""
-    def __init__(self) -> None:
+    """DB class
+
+    Each thread gets its own session from a scoped session registry. A
+    web app calls remove_session() when a request ends, so that every
+    request runs in a session of its own and returns its connection to
+    the pool.
+
+    In production mode (DB_MODE=production) the engine has a connection
+    pool checked before use, and the schema is created when missing but
+    never dropped; the indexes it lacks are added by migrate().
+    Otherwise the database is reset, as the project checks expect.
+    """
+    def __init__(self, url: str = None, production: bool = None) -> None:
         """Initialize a new DB instance"""
-        self._engine = create_engine("sqlite:///a.db", echo=True)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        url = url or DB_URL
+        if production is None:
+            production = DB_MODE == "production"
+        self.production = production
+        if production:
+            connect_args = {}
+            if url.startswith("sqlite"):
+                # Connections are used by one thread at a time, the one of
+                # the session that checked them out
+                connect_args["check_same_thread"] = False
+            self._engine = create_engine(
+                url,
+                poolclass=QueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING,
+                connect_args=connect_args,
+            )
+            create_schema(self._engine)
+            migrate(self._engine)
+        else:
+            self._engine = create_engine(url, echo=True)
+            Base.metadata.drop_all(self._engine)
+            Base.metadata.create_all(self._engine)
+        self._sessions = scoped_session(sessionmaker(bind=self._engine))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object"""
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        """Session object of the current thread"""
+        return self._sessions()
+
+    def remove_session(self) -> None:
+        """Close the session of the current thread, if any"""
+        self._sessions.remove()
+
+    def _commit(self) -> None:
+        """Commit the session, rolling it back if the commit fails"""
+        try:
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Add a user to the database"""
         user = User(email=email, hashed_password=hashed_password)
         self._session.add(user)
-        self._session.commit()
+        self._commit()
         return user
 
     def find_user_by(self, **kwargs) -> User:
@@ -46,11 +173,42 @@ class DB:
         except InvalidRequestError:
             raise InvalidRequestError
 
-    def update_user(self, user_id: int, **kwargs) -> None:
-        """Update user attributes"""
-        user = self.find_user_by(id=user_id)
-        for key, value in kwargs.items():
-            if not hasattr(user, key):
+    def update_users_by(self, values: Dict[str, Any], **kwargs) -> int:
+        """
+        Update the users matching keyword arguments in one UPDATE.
+
+        Args:
+            values (Dict[str, Any]): The new values by column name.
+            **kwargs: The values the users to update have, by column name.
+
+        Returns:
+            int: The number of users updated.
+
+        Raises:
+            ValueError: If a column to set does not exist, or no keyword
+            argument is given.
+            InvalidRequestError: If a keyword argument is not a column.
+        """
+        for key in values:
+            if key not in USER_COLUMNS:
                 raise ValueError(f"Attribute {key} does not exist on User")
-            setattr(user, key, value)
-        self._session.commit()
+        if not kwargs:
+            raise ValueError("No criteria given, refusing to update all")
+        if not USER_COLUMNS.issuperset(kwargs):
+            raise InvalidRequestError
+        if not values:
+            return self._session.query(User).filter_by(**kwargs).count()
+        count = self._session.query(User).filter_by(**kwargs).update(
+            values, synchronize_session=False)
+        self._commit()
+        return count
+
+    def update_user(self, user_id: int, **kwargs) -> None:
+        """Update user attributes
+
+        Raises:
+            ValueError: If an attribute is not a column of User.
+            NoResultFound: If no user has the ID.
+        """
+        if self.update_users_by(kwargs, id=user_id) == 0:
+            raise NoResultFound
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Hasher module: runs bcrypt off the request thread on a bounded pool.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class Hasher:
+    """
+    Bounded thread pool for bcrypt calls.
+
+    bcrypt releases the GIL while hashing, so a thread pool runs hashes in
+    parallel. Once max_pending calls are queued or running, new calls are
+    rejected right away with HasherBusy instead of piling up.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        """
+        Initialize the pool.
+
+        Args:
+            max_workers (int): Number of hashing threads.
+            max_pending (int): Maximum queued and running calls.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="hasher"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._completed = 0
+        self._wait_time = 0.0
+        self._hash_time = 0.0
+
+    def _submit(self, func: Callable, *args) -> Future:
+        """Queue func(*args) on the pool, or raise HasherBusy."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise HasherBusy("Password hashing queue is full")
+            self._pending += 1
+        return self._executor.submit(self._run, time.perf_counter(),
+                                     func, *args)
+
+    def _run(self, queued_at: float, func: Callable, *args):
+        """Run func(*args) on a worker and record its timings."""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+                self._wait_time += started - queued_at
+                self._hash_time += finished - started
+
+    def hashpw(self, password: bytes, salt: bytes) -> bytes:
+        """Hash a password on the pool and wait for the result."""
+        return self._submit(bcrypt.hashpw, password, salt).result()
+
+    def checkpw(self, password: bytes, hashed_password: bytes) -> bool:
+        """Check a password on the pool and wait for the result."""
+        return self._submit(bcrypt.checkpw, password, hashed_password).result()
+
+    async def ahashpw(self, password: bytes, salt: bytes) -> bytes:
+        """Hash a password on the pool without blocking the event loop."""
+        future = self._submit(bcrypt.hashpw, password, salt)
+        return await asyncio.wrap_future(future)
+
+    async def acheckpw(self, password: bytes, hashed_password: bytes) -> bool:
+        """Check a password on the pool without blocking the event loop."""
+        future = self._submit(bcrypt.checkpw, password, hashed_password)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return the pool metrics.
+
+        Returns:
+            dict: pending, completed and rejected call counts, and the
+            average queue wait and hash times in milliseconds.
+        """
+        with self._lock:
+            done = self._completed or 1
+            return {
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": self._wait_time / done * 1000,
+                "avg_hash_ms": self._hash_time / done * 1000,
+            }
+
+    def shutdown(self) -> None:
+        """Wait for queued calls and stop the worker threads."""
+        self._executor.shutdown(wait=True)
+
+
+HASHER = Hasher(
+    max_workers=int(os.getenv("HASHER_WORKERS", "0")) or None,
+    max_pending=int(os.getenv("HASHER_MAX_PENDING", "0")) or None,
+)
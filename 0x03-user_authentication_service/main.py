@@ -21,9 +21,9 @@ user_2 = my_db.add_user("test1@test.com", "SuperHashedPwd1")
 print(user_2.id)
 
 # Testing find_user_by method
-user = my_db.add_user("test@test.com", "PwdHashed")
+user = my_db.add_user("test3@test.com", "PwdHashed")
 print(user.id)
-find_user = my_db.find_user_by(email="test@test.com")
+find_user = my_db.find_user_by(email="test3@test.com")
 print(find_user.id)
 try:
     find_user = my_db.find_user_by(email="test2@test.com")
@@ -37,7 +37,7 @@ except InvalidRequestError:
     print("Invalid")
 
 # Testing update_user method
-email = 'test@test.com'
+email = 'test4@test.com'
 hashed_password = "hashedPwd"
 user = my_db.add_user(email, hashed_password)
 print(user.id)
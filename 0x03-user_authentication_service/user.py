@@ -9,10 +9,15 @@ Base = declarative_base()
 
 
 class User(Base):
-    """User model for a database table named users"""
+    """User model for a database table named users
+
+    email, session_id and reset_token are unique and indexed: they are
+    the lookups behind login, session checks and password resets.
+    """
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True, index=True)
     hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    session_id = Column(String(250), nullable=True, unique=True, index=True)
+    reset_token = Column(String(250), nullable=True, unique=True,
+                         index=True)